@@ -0,0 +1,177 @@
+import time
+import uuid
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from django.core.cache import caches
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+from expense_trackapp.models import TokenCutoff
+from .cache import LRUCache
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication that remembers (user, token) per token key, first
+    in a per-process LRU and then in the shared cache, so warm requests
+    run no authentication queries.
+
+    Signals in api.signals drop the shared cache entry and the local entry
+    of the current process when a token is deleted or its user changes.
+    Other processes keep their local entry until its 10 second TTL runs
+    out.
+    """
+    cache_timeout = 300
+    local_cache = LRUCache(maxsize=1024, ttl=10)
+
+    @staticmethod
+    def get_cache_key(key):
+        return 'api-token:%s' % key
+
+    @classmethod
+    def invalidate(cls, keys):
+        for key in keys:
+            cls.local_cache.delete(key)
+        caches['shared'].delete_many([cls.get_cache_key(key) for key in keys])
+
+    def authenticate_credentials(self, key):
+        credentials = self.local_cache.get(key)
+        if credentials is None:
+            credentials = caches['shared'].get(self.get_cache_key(key))
+            if credentials is None:
+                credentials = super(CachedTokenAuthentication, self).authenticate_credentials(key)
+                caches['shared'].set(self.get_cache_key(key), credentials, self.cache_timeout)
+            self.local_cache.set(key, credentials)
+        return credentials
+
+
+class RevocationList(object):
+    """
+    Ids of revoked signed tokens, kept in the shared cache until the tokens
+    would have expired anyway, so the list stays small. Lookups are kept in
+    a per-process LRU with a short TTL; other processes see a revocation
+    once their entry runs out.
+    """
+
+    def __init__(self):
+        self.local_cache = LRUCache(maxsize=4096, ttl=10)
+
+    @staticmethod
+    def get_cache_key(token_id):
+        return 'api-revoked:%s' % token_id
+
+    def revoke(self, token_id, expires):
+        caches['shared'].set(
+            self.get_cache_key(token_id), expires, max(int(expires - time.time()), 1))
+        self.local_cache.set(token_id, True)
+
+    def is_revoked(self, token_id):
+        revoked = self.local_cache.get(token_id)
+        if revoked is None:
+            revoked = caches['shared'].get(self.get_cache_key(token_id)) is not None
+            self.local_cache.set(token_id, revoked)
+        return revoked
+
+    def clear(self):
+        self.local_cache.clear()
+
+
+class TokenCutoffs(object):
+    """
+    Per-user times before which signed tokens are rejected, set when a user
+    is deactivated, changed or deleted. Stored in TokenCutoff and read
+    through the shared cache and a per-process LRU with a short TTL.
+    """
+    cache_timeout = 300
+
+    def __init__(self):
+        self.local_cache = LRUCache(maxsize=1024, ttl=10)
+
+    @staticmethod
+    def get_cache_key(user_id):
+        return 'api-token-cutoff:%s' % user_id
+
+    def cut(self, user_id):
+        not_before = time.time()
+        TokenCutoff.objects.update_or_create(
+            user_id=user_id, defaults={'not_before': not_before})
+        caches['shared'].set(self.get_cache_key(user_id), not_before, self.cache_timeout)
+        self.local_cache.set(user_id, not_before)
+
+    def get(self, user_id):
+        """
+        Return the cutoff of a user, 0 when there is none.
+        """
+        not_before = self.local_cache.get(user_id)
+        if not_before is None:
+            not_before = caches['shared'].get(self.get_cache_key(user_id))
+            if not_before is None:
+                not_before = TokenCutoff.objects.filter(user_id=user_id).values_list(
+                    'not_before', flat=True).first() or 0
+                caches['shared'].set(self.get_cache_key(user_id), not_before, self.cache_timeout)
+            self.local_cache.set(user_id, not_before)
+        return not_before
+
+    def clear(self):
+        self.local_cache.clear()
+
+
+class SignedTokenAuthentication(TokenAuthentication):
+    """
+    Stateless tokens carrying the user id, username and privilege flags,
+    signed with HMAC over SECRET_KEY. Verifying one needs no database
+    lookup once the user's TokenCutoffs entry is cached. Clients pass them
+    as:
+
+        Authorization: Bearer <token>
+    """
+    keyword = 'Bearer'
+    salt = 'api.authentication.SignedTokenAuthentication'
+    revocation_list = RevocationList()
+    cutoffs = TokenCutoffs()
+
+    @classmethod
+    def issue(cls, user):
+        return signing.dumps({
+            'id': user.pk,
+            'username': user.username,
+            'is_staff': user.is_staff,
+            'is_superuser': user.is_superuser,
+            'jti': uuid.uuid4().hex,
+            'iat': time.time(),
+        }, salt=cls.salt, compress=True)
+
+    @classmethod
+    def revoke_user(cls, user_id):
+        """
+        Reject every token of a user issued until now.
+        """
+        cls.cutoffs.cut(user_id)
+
+    @classmethod
+    def revoke(cls, payload):
+        cls.revocation_list.revoke(
+            payload['jti'], payload['iat'] + settings.API_SIGNED_TOKEN_MAX_AGE)
+
+    def authenticate_credentials(self, key):
+        try:
+            payload = signing.loads(
+                key, salt=self.salt, max_age=settings.API_SIGNED_TOKEN_MAX_AGE)
+        except signing.SignatureExpired:
+            raise AuthenticationFailed('Token has expired.')
+        except signing.BadSignature:
+            raise AuthenticationFailed('Invalid token.')
+
+        if self.revocation_list.is_revoked(payload['jti']):
+            raise AuthenticationFailed('Token has been revoked.')
+        if payload['iat'] < self.cutoffs.get(payload['id']):
+            raise AuthenticationFailed('Token has been revoked.')
+
+        user = User(
+            id=payload['id'],
+            username=payload['username'],
+            is_staff=payload['is_staff'],
+            is_superuser=payload['is_superuser'],
+        )
+        user._state.adding = False
+        return user, payload
@@ -0,0 +1,245 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from django.core.cache import caches
+
+
+class LRUCache(object):
+    """
+    Small thread-safe in-process cache with a size bound and a TTL.
+    Entries are kept in recency order; the least recently used one is
+    evicted when the cache is full.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                expires, value = self._data.pop(key)
+            except KeyError:
+                return default
+            if expires < time.time():
+                return default
+            self._data[key] = (expires, value)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (time.time() + self.ttl, value)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TieredCache(object):
+    """
+    A bounded LRUCache per process in front of the shared Django cache,
+    counting hits and misses per key.
+
+    Keys belong to groups, e.g. a user. Deleting keys bumps the generation
+    of their group in the shared cache, and local entries are only used
+    while their group has the generation they were stored with, so deletes
+    reach the local tier of every process.
+    """
+
+    def __init__(self, prefix, timeout, maxsize=4096, ttl=30, alias='shared'):
+        self.prefix = prefix
+        self.timeout = timeout
+        self.alias = alias
+        self.local_cache = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.stats = {'hits': 0, 'local_hits': 0, 'misses': 0}
+        self._lock = threading.Lock()
+
+    @property
+    def backend(self):
+        return caches[self.alias]
+
+    def make_key(self, key):
+        return '%s:%s' % (self.prefix, key)
+
+    def make_generation_key(self, group):
+        return '%s-generation:%s' % (self.prefix, group)
+
+    def get_generation(self, group):
+        generation = self.backend.get(self.make_generation_key(group))
+        if generation is None:
+            generation = uuid.uuid4().hex
+            if not self.backend.add(self.make_generation_key(group), generation, None):
+                generation = self.backend.get(self.make_generation_key(group))
+        return generation
+
+    def count(self, **counts):
+        with self._lock:
+            for name, value in counts.items():
+                self.stats[name] += value
+
+    def get_many(self, group, keys, generation=None):
+        if generation is None:
+            generation = self.get_generation(group)
+        found = {}
+        missing = []
+        for key in keys:
+            value = self.local_cache.get((group, generation, key))
+            if value is None:
+                missing.append(key)
+            else:
+                found[key] = value
+        local_hits = len(found)
+
+        if missing:
+            shared = self.backend.get_many([self.make_key(key) for key in missing])
+            for key in missing:
+                value = shared.get(self.make_key(key))
+                if value is not None:
+                    self.local_cache.set((group, generation, key), value)
+                    found[key] = value
+
+        self.count(hits=len(found), local_hits=local_hits, misses=len(keys) - len(found))
+        return found
+
+    def set_many(self, group, values, generation=None):
+        """
+        Pass the generation read before computing the values, so values
+        computed before a delete of their group are not stored.
+
+        The generation is checked before writing, and again after, as a
+        delete may bump it in between; the values written are then dropped.
+        A delete after the second check removes them itself.
+        """
+        if generation is None:
+            generation = self.get_generation(group)
+        elif self.get_generation(group) != generation:
+            return
+        for key, value in values.items():
+            self.local_cache.set((group, generation, key), value)
+        shared_keys = {self.make_key(key): value for key, value in values.items()}
+        self.backend.set_many(shared_keys, self.timeout)
+        if self.get_generation(group) != generation:
+            self.backend.delete_many(list(shared_keys))
+
+    def delete_many(self, group, keys):
+        # The generation is bumped first, see set_many.
+        self.backend.set(self.make_generation_key(group), uuid.uuid4().hex, None)
+        self.backend.delete_many([self.make_key(key) for key in keys])
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = round(float(stats['hits']) / lookups, 4) if lookups else None
+        stats['local_size'] = len(self.local_cache)
+        return stats
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats = dict.fromkeys(self.stats, 0)
+
+
+class SingleFlight(object):
+    """
+    Coalesce concurrent calls with the same key within a process: the
+    first caller runs the function, the others wait for it and share its
+    result, or its exception.
+    """
+
+    class Call(object):
+        def __init__(self):
+            self.event = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.shared = 0
+
+    def do(self, key, function):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self.Call()
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = function()
+        except Exception as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result
+
+
+class CacheLock(object):
+    """
+    Best-effort lock shared by processes through the shared Django cache,
+    whose add() must be atomic across them, e.g. the database cache or
+    memcached.
+
+    Entering takes the lock, or waits up to `wait` seconds for its holder
+    to release it and tries once more. The body runs either way; `acquired`
+    tells whether the lock is held. An abandoned lock expires after
+    `timeout` seconds.
+    """
+
+    def __init__(self, key, timeout=10, wait=5, interval=0.05, alias='shared'):
+        self.key = key
+        self.timeout = timeout
+        self.wait = wait
+        self.interval = interval
+        self.alias = alias
+        self.token = uuid.uuid4().hex
+        self.acquired = False
+
+    @property
+    def backend(self):
+        return caches[self.alias]
+
+    def acquire(self):
+        self.acquired = self.backend.add(self.key, self.token, self.timeout)
+        return self.acquired
+
+    def release(self):
+        # Not atomic, but a lock that expired and was taken by another
+        # process in between is only dropped early.
+        if self.acquired and self.backend.get(self.key) == self.token:
+            self.backend.delete(self.key)
+        self.acquired = False
+
+    def __enter__(self):
+        if not self.acquire():
+            deadline = time.time() + self.wait
+            while self.backend.get(self.key) is not None and time.time() < deadline:
+                time.sleep(self.interval)
+            self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.checks import Warning, register
+from expense_trackapp.checks import is_per_process
+
+
+@register()
+def check_report_cache_lock(app_configs, **kwargs):
+    """
+    CacheLock coordinates processes only through a shared backend.
+    """
+    if settings.REPORT_CACHE_LOCK and is_per_process('shared'):
+        return [Warning(
+            'REPORT_CACHE_LOCK is on, but the shared cache uses a per-process backend.',
+            hint=(
+                'The lock only keeps threads of one process apart. Use the '
+                'database cache or memcached for CACHES["shared"], or turn '
+                'REPORT_CACHE_LOCK off.'
+            ),
+            id='api.W001',
+        )]
+    return []
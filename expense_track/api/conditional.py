@@ -0,0 +1,48 @@
+import hashlib
+from functools import wraps
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+from expense_trackapp import versions
+
+
+def get_request_version(request):
+    """
+    Superusers see every user's expenses, so their responses follow the
+    version of the whole table.
+    """
+    if request.user.is_superuser:
+        return versions.get_version()
+    return versions.get_version(request.user.pk)
+
+
+def expense_etag(request, extra=''):
+    key = '%s:%s:%s:%s:%s' % (
+        get_request_version(request), request.user.pk, request.user.is_superuser,
+        request.get_full_path(), extra)
+    return hashlib.md5(key.encode('utf-8')).hexdigest()
+
+
+def conditional_expenses(view, etag_key=None):
+    """
+    Answer GET requests with a matching If-None-Match with 304 Not
+    Modified, before the view reads any expenses. Responses are private
+    and revalidated on every use.
+
+    No Last-Modified is sent: its one second resolution would answer 304
+    to clients that fetched in the same second as a write.
+
+    Views whose response depends on more than the expenses and the URL,
+    e.g. on parameters defaulted from the current date, pass `etag_key`,
+    a function of the request and URL kwargs added to the ETag.
+    """
+    def etag(request, *args, **kwargs):
+        return expense_etag(request, etag_key(request, **kwargs) if etag_key else '')
+
+    view = condition(etag_func=etag)(view)
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+    return wrapper
@@ -0,0 +1,43 @@
+from collections import namedtuple
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import _positive_int
+
+
+TableRequest = namedtuple('TableRequest', ['draw', 'start', 'length', 'ordering', 'search'])
+
+# Sortable columns and the orderings that serve them from an index.
+ORDERINGS = {
+    'date': ('date', 'time', 'pk'),
+    'time': ('time', 'pk'),
+    'amount': ('amount', 'pk'),
+}
+DEFAULT_ORDERING = ORDERINGS['date']
+MAX_LENGTH = 1000
+
+
+def parse_request(query_params):
+    """
+    Read the parameters of a DataTables server-side request. Only the
+    first sort column is used, and only if it can be ordered by an index.
+    """
+    try:
+        draw = int(query_params.get('draw', 0))
+        start = _positive_int(query_params.get('start', 0))
+        length = int(query_params.get('length', 10))
+    except ValueError:
+        raise ValidationError({'detail': 'Invalid draw, start or length.'})
+
+    # DataTables asks for every row with -1.
+    if length < 0 or length > MAX_LENGTH:
+        length = MAX_LENGTH
+
+    ordering = DEFAULT_ORDERING
+    column = query_params.get('order[0][column]')
+    if column is not None:
+        name = query_params.get('columns[%s][data]' % column)
+        ordering = ORDERINGS.get(name, DEFAULT_ORDERING)
+        if query_params.get('order[0][dir]') == 'desc':
+            ordering = tuple('-' + field for field in ordering)
+
+    search = query_params.get('search[value]', '').strip()
+    return TableRequest(draw, start, length, ordering, search)
@@ -0,0 +1,44 @@
+import csv
+import json
+from collections import OrderedDict
+from django.utils import six
+from .serializers import ExpenseRowSerializer
+
+
+EXPORT_FIELDS = ExpenseRowSerializer.fields
+VALUES_FIELDS = ExpenseRowSerializer.values_fields
+format_row = ExpenseRowSerializer.format_row
+
+
+class Echo(object):
+    """
+    File-like object whose write returns the value, so csv.writer can
+    produce one line at a time.
+    """
+
+    def write(self, value):
+        return value
+
+
+def encode(value):
+    if six.PY2 and isinstance(value, six.text_type):
+        return value.encode('utf-8')
+    return value
+
+
+def csv_lines(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        yield writer.writerow([encode(value) for value in format_row(row)])
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(OrderedDict(zip(EXPORT_FIELDS, format_row(row)))) + '\n'
+
+
+EXPORT_FORMATS = {
+    'csv': (csv_lines, 'text/csv; charset=utf-8'),
+    'ndjson': (ndjson_lines, 'application/x-ndjson'),
+}
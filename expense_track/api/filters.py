@@ -1,4 +1,5 @@
 import django_filters
+from django.db.models import Q
 from expense_trackapp.models import Expense
 
 
@@ -6,7 +7,12 @@ class ExpenseFilter(django_filters.rest_framework.FilterSet):
     date = django_filters.DateFromToRangeFilter()
     time = django_filters.TimeRangeFilter()
     amount = django_filters.RangeFilter()
+    search = django_filters.CharFilter(method='filter_search')
 
     class Meta:
         model = Expense
         fields = ['date', 'time', 'amount']
+
+    def filter_search(self, queryset, name, value):
+        return queryset.filter(
+            Q(description__icontains=value) | Q(comment__icontains=value))
@@ -0,0 +1,161 @@
+import errno
+import json
+import logging
+import os
+import socket
+import uuid
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Q
+from django.utils import six, timezone
+from django.utils.dateparse import parse_date
+from rest_framework.renderers import JSONRenderer
+from expense_trackapp.models import Expense, Job
+from . import report_cache
+from .export import EXPORT_FORMATS, VALUES_FIELDS
+from .filters import ExpenseFilter
+from .serializers import ReportBucketSerializer
+
+
+logger = logging.getLogger('api.jobs')
+
+
+def get_result_path(job):
+    return os.path.join(settings.JOB_RESULT_DIR, job.result_name)
+
+
+def write_result(job, extension, chunks):
+    """
+    Write the result of a job to a file in JOB_RESULT_DIR and return its name.
+    Every run writes its own file, so a worker still running a requeued job
+    never writes to the file of the run that replaced it.
+    """
+    try:
+        os.makedirs(settings.JOB_RESULT_DIR)
+    except OSError as error:
+        if error.errno != errno.EEXIST:
+            raise
+
+    name = 'job-%s-%s.%s' % (job.pk, uuid.uuid4().hex, extension)
+    with open(os.path.join(settings.JOB_RESULT_DIR, name), 'wb') as result:
+        for chunk in chunks:
+            if isinstance(chunk, six.text_type):
+                chunk = chunk.encode('utf-8')
+            result.write(chunk)
+    return name
+
+
+def remove_result(result_name):
+    try:
+        os.remove(os.path.join(settings.JOB_RESULT_DIR, result_name))
+    except OSError as error:
+        if error.errno != errno.ENOENT:
+            raise
+
+
+def run_export(job, params):
+    if job.user.is_superuser:
+        queryset = Expense.objects.all()
+    else:
+        queryset = Expense.objects.filter(user=job.user)
+    queryset = ExpenseFilter(params['filters'], queryset=queryset).qs
+    rows = queryset.order_by('date', 'amount', 'pk').values_list(*VALUES_FIELDS)
+    lines, content_type = EXPORT_FORMATS[params['format']]
+
+    return write_result(job, params['format'], lines(rows.iterator())), content_type
+
+
+def run_report(job, params):
+    start, end = parse_date(params['start']), parse_date(params['end'])
+    buckets = report_cache.get_report(params['user_id'], params['period'], start, end)
+    content = JSONRenderer().render({
+        'period': params['period'],
+        'start': start,
+        'end': end,
+        'buckets': ReportBucketSerializer(buckets, many=True).data
+    })
+
+    return write_result(job, 'json', [content]), 'application/json'
+
+
+RUNNERS = {
+    Job.EXPORT: run_export,
+    Job.REPORT: run_report,
+}
+
+
+def get_worker_id():
+    """
+    Return an id unique to this worker process, across hosts and restarts.
+    """
+    return '%s:%s:%s' % (socket.gethostname(), os.getpid(), uuid.uuid4().hex[:8])
+
+
+def claim_job(worker):
+    """
+    Mark the oldest queued job as running by `worker` and return it, or
+    None when the queue is empty. The status is changed with a conditional
+    UPDATE, so two workers never run the same job.
+    """
+    queued = Job.objects.filter(status=Job.QUEUED).order_by('created_at', 'pk')
+    for pk in queued.values_list('pk', flat=True)[:10]:
+        now = timezone.now()
+        claimed = Job.objects.filter(pk=pk, status=Job.QUEUED).update(
+            status=Job.RUNNING, worker=worker, started_at=now, heartbeat_at=now)
+        if claimed:
+            return Job.objects.select_related('user').get(pk=pk)
+    return None
+
+
+def run_job(job):
+    """
+    Run a claimed job and record its result, or its error. Nothing is
+    recorded if the job was requeued meanwhile, it belongs to another
+    worker now.
+    """
+    result_name = ''
+    try:
+        result_name, content_type = RUNNERS[job.kind](job, json.loads(job.params))
+    except Exception as error:
+        logger.exception('Job %s failed.', job.pk)
+        changes = {'status': Job.FAILED, 'error': str(error)}
+    else:
+        changes = {
+            'status': Job.DONE, 'result_name': result_name, 'content_type': content_type}
+
+    finished = Job.objects.filter(pk=job.pk, status=Job.RUNNING, worker=job.worker).update(
+        finished_at=timezone.now(), **changes)
+    if not finished:
+        logger.warning('Job %s was requeued while running, its result is dropped.', job.pk)
+        if result_name:
+            remove_result(result_name)
+
+
+def send_heartbeat(worker):
+    """
+    Renew the heartbeat of the jobs `worker` is running.
+    """
+    return Job.objects.filter(status=Job.RUNNING, worker=worker).update(
+        heartbeat_at=timezone.now())
+
+
+def requeue_stale_jobs():
+    """
+    Queue again the running jobs without a heartbeat for JOB_TIMEOUT, whose
+    worker died.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.JOB_TIMEOUT)
+    stale = Job.objects.filter(status=Job.RUNNING).filter(
+        Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True))
+    return stale.update(status=Job.QUEUED, worker='', started_at=None, heartbeat_at=None)
+
+
+def prune_jobs():
+    """
+    Delete the jobs finished more than JOB_MAX_AGE ago, and their results.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.JOB_MAX_AGE)
+    jobs = Job.objects.filter(finished_at__lt=cutoff)
+    for result_name in jobs.exclude(result_name='').values_list('result_name', flat=True):
+        remove_result(result_name)
+    return jobs.delete()[0]
@@ -0,0 +1,67 @@
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+from expense_trackapp.models import Expense
+from api.serializers import ExpenseRowSerializer, ExpenseSerializer
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare rendering expense listings with ExpenseSerializer and with '
+        'ExpenseRowSerializer. Rows are created in a transaction that is '
+        'rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows', type=int, action='append', dest='sizes', default=[],
+            help='Number of rows to render (can be repeated, default 10000 and 100000).'
+        )
+
+    def handle(self, *args, **options):
+        for size in options['sizes'] or [10000, 100000]:
+            try:
+                with transaction.atomic():
+                    self.bench(size)
+                    raise Rollback
+            except Rollback:
+                pass
+
+    def bench(self, size):
+        user = User.objects.create_user(username='bench-serializers')
+        start = date(2017, 1, 1)
+        Expense.objects.bulk_create([
+            Expense(
+                user=user,
+                date=start + timedelta(days=index % 365),
+                amount=Decimal(index % 10000) / 100,
+                description='Expense %s' % index,
+            )
+            for index in range(size)
+        ])
+        queryset = Expense.objects.filter(user=user).order_by('date', 'amount', 'pk')
+        renderer = JSONRenderer()
+
+        started = time.time()
+        model_output = renderer.render(
+            ExpenseSerializer(queryset.select_related('user'), many=True).data)
+        model_time = time.time() - started
+
+        started = time.time()
+        row_output = renderer.render(ExpenseRowSerializer(
+            queryset.values_list(*ExpenseRowSerializer.values_fields)).data)
+        row_time = time.time() - started
+
+        self.stdout.write(
+            '%s rows: ExpenseSerializer %.3fs, ExpenseRowSerializer %.3fs, '
+            '%.1fx faster, identical output: %s.' % (
+                size, model_time, row_time, model_time / row_time,
+                model_output == row_output))
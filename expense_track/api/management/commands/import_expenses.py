@@ -0,0 +1,147 @@
+import csv
+import io
+import os
+import time
+from itertools import islice
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import six
+from expense_trackapp.models import Expense
+from api.serializers import ExpenseSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        'Import expenses from a CSV file with a header row. Columns are '
+        'user, date, time, amount, description and comment; only amount '
+        'is required.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file to import.')
+        parser.add_argument(
+            '--user', dest='default_user',
+            help='Username for rows without a user column value.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Rows validated and inserted per transaction.'
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='Checkpoint file, defaults to <path>.checkpoint.'
+        )
+        parser.add_argument(
+            '--resume', action='store_true',
+            help='Skip the rows committed by a previous run.'
+        )
+
+    def handle(self, *args, **options):
+        self.users = {}
+        self.default_user = options['default_user']
+        checkpoint = options['checkpoint'] or options['path'] + '.checkpoint'
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('Batch size must be positive.')
+
+        offset = 0
+        if options['resume'] and os.path.exists(checkpoint):
+            with open(checkpoint) as checkpoint_file:
+                offset = int(checkpoint_file.read().strip() or 0)
+            self.stdout.write('Resuming after row %s.' % offset)
+
+        imported = skipped = 0
+        started = time.time()
+        with self.open_csv(options['path']) as csv_file:
+            reader = csv.DictReader(csv_file)
+            rows = islice(reader, offset, None)
+            while True:
+                batch = [self.decode(row) for row in islice(rows, batch_size)]
+                if not batch:
+                    break
+
+                created, errors = self.import_batch(batch, offset)
+                imported += created
+                skipped += len(errors)
+                offset += len(batch)
+                self.write_checkpoint(checkpoint, offset)
+
+                for line, error in errors:
+                    self.stderr.write('Row %s skipped: %s' % (line, error))
+                self.stdout.write('Imported %s rows (%.0f rows/s).' % (
+                    imported, imported / max(time.time() - started, 1e-6)))
+
+        self.stdout.write('Done: %s imported, %s skipped, %s rows read.' % (
+            imported, skipped, offset))
+
+    def open_csv(self, path):
+        if six.PY2:
+            return open(path, 'rb')
+        return io.open(path, newline='', encoding='utf-8')
+
+    def decode(self, row):
+        """
+        Drop empty cells so optional columns fall back to their defaults.
+        """
+        if six.PY2:
+            return {
+                key.decode('utf-8'): value.decode('utf-8')
+                for key, value in row.items() if key and value
+            }
+        return {key: value for key, value in row.items() if key and value}
+
+    def get_users(self, usernames):
+        """
+        Map usernames to users, querying only the ones not seen before.
+        """
+        missing = set(usernames).difference(self.users)
+        if missing:
+            for user in User.objects.filter(username__in=missing):
+                self.users[user.username] = user
+            for username in missing.difference(self.users):
+                self.users[username] = None
+        return self.users
+
+    def import_batch(self, batch, offset):
+        """
+        Validate a batch with ExpenseSerializer and bulk insert the valid
+        rows in one transaction. Returns the created count and a list of
+        (line, error) for skipped rows.
+        """
+        serializer = ExpenseSerializer(data=batch, many=True)
+        if serializer.is_valid():
+            row_errors = [{} for row in batch]
+        else:
+            # A list serializer drops all validated data on any error,
+            # so validate the rows that passed once more.
+            row_errors = serializer.errors
+            serializer = ExpenseSerializer(
+                data=[row for row, error in zip(batch, row_errors) if not error], many=True)
+            serializer.is_valid()
+
+        usernames = [row.get('user') or self.default_user for row in batch]
+        users = self.get_users(filter(None, usernames))
+
+        expenses, errors = [], []
+        validated = iter(serializer.validated_data)
+        for index, (row_error, username) in enumerate(zip(row_errors, usernames)):
+            # The header is row 1, so the first data row is row 2.
+            line = offset + index + 2
+            data = next(validated) if not row_error else None
+            if row_error:
+                errors.append((line, dict(row_error)))
+            elif not users.get(username):
+                errors.append((line, {'user': ['User does not exist.']}))
+            else:
+                expenses.append(Expense(user=users[username], **data))
+
+        with transaction.atomic():
+            Expense.objects.bulk_create(expenses)
+        return len(expenses), errors
+
+    def write_checkpoint(self, path, offset):
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w') as checkpoint_file:
+            checkpoint_file.write(str(offset))
+        os.rename(temp_path, path)
@@ -0,0 +1,90 @@
+import threading
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from api import jobs
+
+
+class Command(BaseCommand):
+    help = (
+        'Run queued report and export jobs with a pool of worker threads. '
+        'Running jobs are kept alive with a heartbeat, jobs whose worker '
+        'died are queued again, and old finished jobs are pruned.'
+    )
+    prune_interval = 60 * 10
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=2,
+            help='Number of jobs run at once (default 2).'
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=1.0,
+            help='Seconds between queue checks when it is empty (default 1).'
+        )
+        parser.add_argument(
+            '--once', action='store_true', default=False,
+            help='Exit once the queue is empty.'
+        )
+
+    def handle(self, *args, **options):
+        self.stop = threading.Event()
+        self.processed = 0
+        self.lock = threading.Lock()
+        self.worker_id = jobs.get_worker_id()
+        self.heartbeat_at = self.pruned_at = 0
+        self.maintain()
+
+        workers = [
+            threading.Thread(target=self.work, args=(options['poll_interval'], options['once']))
+            for index in range(max(options['workers'], 1))
+        ]
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+        # Running jobs keep their heartbeat while the workers finish them.
+        while any(worker.is_alive() for worker in workers):
+            try:
+                for worker in workers:
+                    worker.join(0.5)
+            except KeyboardInterrupt:
+                if self.stop.is_set():
+                    raise
+                self.stdout.write('Stopping after the running jobs.')
+                self.stop.set()
+            self.maintain()
+
+        self.stdout.write('Done: %s jobs run.' % self.processed)
+
+    def work(self, poll_interval, once):
+        try:
+            while not self.stop.is_set():
+                job = jobs.claim_job(self.worker_id)
+                if job is None:
+                    if once:
+                        return
+                    self.stop.wait(poll_interval)
+                    continue
+
+                jobs.run_job(job)
+                with self.lock:
+                    self.processed += 1
+        finally:
+            connection.close()
+
+    def maintain(self):
+        """
+        Renew the heartbeat of our running jobs and requeue those of dead
+        workers every JOB_HEARTBEAT_INTERVAL, prune old jobs now and then.
+        """
+        now = time.time()
+        if now - self.heartbeat_at >= settings.JOB_HEARTBEAT_INTERVAL:
+            self.heartbeat_at = now
+            jobs.send_heartbeat(self.worker_id)
+            requeued = jobs.requeue_stale_jobs()
+            if requeued:
+                self.stdout.write('Requeued %s stale jobs.' % requeued)
+        if now - self.pruned_at >= self.prune_interval:
+            self.pruned_at = now
+            jobs.prune_jobs()
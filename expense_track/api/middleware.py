@@ -0,0 +1,100 @@
+import json
+import logging
+import threading
+import time
+from django.conf import settings
+from django.db import connections
+
+
+logger = logging.getLogger('api.instrumentation')
+
+
+class SQLInstrumentationMiddleware(object):
+    """
+    Record the query count, SQL time, slowest query and view time of each
+    request when SQL_INSTRUMENTATION is on. They are sent as Server-Timing
+    headers and logged as JSON per request, with running totals per URL
+    name logged every SQL_INSTRUMENTATION_SUMMARY_INTERVAL requests.
+
+    Queries are captured without DEBUG by forcing the debug cursor for the
+    duration of the request. Queries run while a streaming response is
+    consumed happen after the middleware returns and are not counted.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.stats = {}
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, request):
+        if not settings.SQL_INSTRUMENTATION:
+            return self.get_response(request)
+
+        databases = connections.all()
+        states = [
+            (connection, connection.force_debug_cursor, len(connection.queries_log))
+            for connection in databases
+        ]
+        for connection in databases:
+            connection.force_debug_cursor = True
+
+        started = time.time()
+        try:
+            response = self.get_response(request)
+        finally:
+            view_time = (time.time() - started) * 1000
+            queries = []
+            for connection, force_debug_cursor, start in states:
+                connection.force_debug_cursor = force_debug_cursor
+                queries.extend(list(connection.queries_log)[start:])
+
+        url_name = getattr(request.resolver_match, 'url_name', None) or 'unresolved'
+        metrics = self.get_metrics(queries, view_time)
+        response['Server-Timing'] = self.get_server_timing(metrics)
+        self.record(url_name, request, response, metrics)
+        return response
+
+    def get_metrics(self, queries, view_time):
+        times = [float(query['time']) * 1000 for query in queries]
+        slowest = max(range(len(queries)), key=times.__getitem__) if queries else None
+        return {
+            'queries': len(queries),
+            'sql_ms': round(sum(times), 2),
+            'slowest_ms': round(times[slowest], 2) if queries else 0,
+            'slowest_sql': queries[slowest]['sql'][:200] if queries else None,
+            'view_ms': round(view_time, 2),
+        }
+
+    def get_server_timing(self, metrics):
+        return ', '.join([
+            'sql;dur=%s;desc="%s queries"' % (metrics['sql_ms'], metrics['queries']),
+            'sql-slowest;dur=%s' % metrics['slowest_ms'],
+            'view;dur=%s' % metrics['view_ms'],
+        ])
+
+    def record(self, url_name, request, response, metrics):
+        logger.info(json.dumps(dict(
+            metrics, url_name=url_name, method=request.method, status=response.status_code)))
+
+        with self.lock:
+            stats = self.stats.setdefault(url_name, {
+                'requests': 0, 'queries': 0, 'sql_ms': 0, 'view_ms': 0, 'max_view_ms': 0})
+            stats['requests'] += 1
+            stats['queries'] += metrics['queries']
+            stats['sql_ms'] += metrics['sql_ms']
+            stats['view_ms'] += metrics['view_ms']
+            stats['max_view_ms'] = max(stats['max_view_ms'], metrics['view_ms'])
+
+            self.requests += 1
+            if self.requests % settings.SQL_INSTRUMENTATION_SUMMARY_INTERVAL:
+                return
+            summary = {
+                name: dict(
+                    values,
+                    avg_queries=round(float(values['queries']) / values['requests'], 2),
+                    avg_sql_ms=round(values['sql_ms'] / values['requests'], 2),
+                    avg_view_ms=round(values['view_ms'] / values['requests'], 2))
+                for name, values in self.stats.items()
+            }
+        logger.info(json.dumps({'summary': summary}, sort_keys=True))
@@ -0,0 +1,165 @@
+from base64 import b64decode, b64encode
+from collections import namedtuple
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from collections import OrderedDict
+from django.db.models import Q
+from django.utils.six.moves.urllib import parse as urlparse
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from expense_trackapp.pagination import EstimatedCountPaginator
+
+
+Cursor = namedtuple('Cursor', ['reverse', 'position'])
+
+
+class ExpenseCursorPagination(CursorPagination):
+    """
+    Keyset pagination over (date, amount, pk).
+
+    Unlike the stock DRF cursor, the position holds every ordering column,
+    so a page is fetched with a single range condition and never with an
+    OFFSET. Each page costs the same no matter how deep the client scrolls.
+    """
+    ordering = ('date', 'amount', 'pk')
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+                cutoff=self.max_page_size
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+
+        if self.cursor is None:
+            reverse, position = False, None
+        else:
+            reverse, position = self.cursor
+
+        if reverse:
+            queryset = queryset.order_by('-date', '-amount', '-pk')
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        if position is not None:
+            queryset = self.filter_by_position(queryset, position, reverse)
+
+        # Fetch one extra row to find out if there is a following page.
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_following = len(results) > len(self.page)
+
+        if reverse:
+            self.page.reverse()
+
+        first = self._get_position_from_instance(self.page[0]) if self.page else position
+        last = self._get_position_from_instance(self.page[-1]) if self.page else position
+
+        if reverse:
+            self.has_next = position is not None
+            self.has_previous = has_following
+        else:
+            self.has_next = has_following
+            self.has_previous = position is not None
+        self.next_position = last
+        self.previous_position = first
+
+        return self.page
+
+    def filter_by_position(self, queryset, position, reverse):
+        """
+        Restrict the queryset to rows strictly after (or before, when
+        reversed) the given (date, amount, pk) position.
+        """
+        date, amount, pk = position
+        op = 'lt' if reverse else 'gt'
+        bound = 'lte' if reverse else 'gte'
+
+        return queryset.filter(**{'date__' + bound: date}).filter(
+            Q(**{'date__' + op: date}) |
+            Q(date=date, **{'amount__' + op: amount}) |
+            Q(date=date, amount=amount, **{'pk__' + op: pk})
+        )
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(Cursor(reverse=False, position=self.next_position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self.encode_cursor(Cursor(reverse=True, position=self.previous_position))
+
+    def decode_cursor(self, request):
+        """
+        Given a request with a cursor, return a `Cursor` instance.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            querystring = b64decode(encoded.encode('ascii')).decode('ascii')
+            tokens = urlparse.parse_qs(querystring, keep_blank_values=True)
+
+            reverse = bool(int(tokens.get('r', ['0'])[0]))
+            date, amount, pk = tokens['p']
+            position = (
+                datetime.strptime(date, '%Y-%m-%d').date(),
+                Decimal(amount),
+                _positive_int(pk)
+            )
+        except (TypeError, ValueError, KeyError, InvalidOperation):
+            raise NotFound(self.invalid_cursor_message)
+
+        return Cursor(reverse=reverse, position=position)
+
+    def encode_cursor(self, cursor):
+        """
+        Given a Cursor instance, return an url with encoded cursor.
+        """
+        tokens = {'p': [str(value) for value in cursor.position]}
+        if cursor.reverse:
+            tokens['r'] = '1'
+
+        querystring = urlparse.urlencode(tokens, doseq=True)
+        encoded = b64encode(querystring.encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def _get_position_from_instance(self, instance, ordering=None):
+        if isinstance(instance, dict):
+            return tuple(instance[field] for field in self.ordering)
+        return tuple(getattr(instance, field) for field in self.ordering)
+
+
+class EstimatedCountPagination(PageNumberPagination):
+    """
+    Page number pagination whose count of an unfiltered queryset comes
+    from the cached row count, flagged by `approximate` in the response.
+    """
+    django_paginator_class = EstimatedCountPaginator
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('count', self.page.paginator.count),
+            ('approximate', self.page.paginator.approximate),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data)
+        ]))
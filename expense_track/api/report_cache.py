@@ -0,0 +1,105 @@
+from django.conf import settings
+from django.db import transaction
+from expense_trackapp import reports
+from expense_trackapp.models import Expense
+from .cache import CacheLock, SingleFlight, TieredCache
+
+
+report_cache = TieredCache('report', settings.REPORT_CACHE_TIMEOUT)
+
+report_flight = SingleFlight()
+
+
+def get_key(user_id, period, bucket):
+    return '%s:%s:%s' % (user_id, period, '-'.join(str(part) for part in bucket))
+
+
+class UserReportCache(object):
+    """
+    The cached report buckets of one user and period, as read and written
+    by expense_trackapp.reports.get_report.
+
+    With `lock`, a read that misses takes a CacheLock on the missing
+    buckets, held until they are written, so other processes wait for them
+    instead of computing them too.
+    """
+
+    def __init__(self, user_id, period, lock=False):
+        self.user_id = user_id
+        self.period = period
+        self.lock = lock
+        self.held_lock = None
+        self.generation = None
+
+    def get_many(self, buckets):
+        found = self.read(buckets)
+        missing = [bucket for bucket in buckets if bucket not in found]
+        if self.lock and missing:
+            lock_key = 'report-lock:%s' % get_key(
+                self.user_id, self.period, missing[0] + ('to', ) + missing[-1])
+            self.held_lock = CacheLock(lock_key).__enter__()
+            # Filled by the previous holder while we waited.
+            found.update(self.read(missing))
+        return found
+
+    def read(self, buckets):
+        if self.generation is None:
+            self.generation = report_cache.get_generation(self.user_id)
+        keys = {get_key(self.user_id, self.period, bucket): bucket for bucket in buckets}
+        found = report_cache.get_many(self.user_id, list(keys), self.generation)
+        return {keys[key]: list(values) for key, values in found.items()}
+
+    def set_many(self, values):
+        report_cache.set_many(self.user_id, {
+            get_key(self.user_id, self.period, bucket): bucket_values
+            for bucket, bucket_values in values.items()
+        }, self.generation)
+        self.release()
+
+    def release(self):
+        if self.held_lock is not None:
+            self.held_lock.release()
+            self.held_lock = None
+
+
+def get_report(user_id, period, start, end):
+    """
+    Return expense_trackapp.reports.get_report for one user, through the
+    report cache when REPORT_CACHE is on. Concurrent identical requests in
+    a process share a single computation.
+    """
+    def compute():
+        expenses = Expense.objects.filter(user_id=user_id)
+        if not settings.REPORT_CACHE or user_id is None:
+            return reports.get_report(expenses, period, start, end)
+
+        cache = UserReportCache(user_id, period, lock=settings.REPORT_CACHE_LOCK)
+        try:
+            return reports.get_report(expenses, period, start, end, cache)
+        finally:
+            cache.release()
+
+    return report_flight.do(('summary', user_id, period, start, end), compute)
+
+
+def invalidate(days):
+    """
+    Drop the cached buckets of every period the (user_id, date) pairs fall
+    into. They are dropped again on commit, which also bumps the user's
+    generation, so a report computed from data read before the commit
+    cannot store its buckets afterwards, see TieredCache.set_many.
+    """
+    keys = {}
+    for user_id, day in days:
+        keys.setdefault(user_id, set()).update(
+            get_key(user_id, period, reports.get_bucket(period, day))
+            for period in reports.PERIODS)
+    if not keys:
+        return
+
+    def delete():
+        for user_id, user_keys in keys.items():
+            report_cache.delete_many(user_id, list(user_keys))
+
+    delete()
+    transaction.on_commit(delete)
@@ -1,9 +1,26 @@
+import json
+from collections import OrderedDict
 from django.contrib.auth.models import User
+from django.core.urlresolvers import reverse
+from django.utils import six
 from rest_framework import serializers, validators
-from expense_trackapp.models import Expense
+from expense_trackapp.models import Expense, Job
 
 
-class UserSerializer(serializers.ModelSerializer):
+class SparseFieldsMixin(object):
+    """
+    Serializer taking a `fields` argument, the names of the fields to keep.
+    """
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super(SparseFieldsMixin, self).__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields).difference(fields):
+                self.fields.pop(name)
+
+
+class UserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """
     User serializer.
     """
@@ -36,7 +53,7 @@ class UserSerializer(serializers.ModelSerializer):
         return user
 
 
-class ExpenseSerializer(serializers.ModelSerializer):
+class ExpenseSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """
     Expense serializer.
     """
@@ -45,3 +62,128 @@ class ExpenseSerializer(serializers.ModelSerializer):
     class Meta:
         model = Expense
         fields = ('user', 'pk', 'date', 'time', 'amount', 'description', 'comment')
+
+
+def get_converter(field):
+    """
+    Return a function producing the representation of a serializer field
+    from a plain database value, picked once instead of per value.
+    """
+    if isinstance(field, serializers.DateField):
+        return lambda value: value.isoformat() if value else None
+    if isinstance(field, serializers.TimeField):
+        return lambda value: value.isoformat()
+    if isinstance(field, serializers.DecimalField):
+        return ('{0:.%sf}' % field.decimal_places).format
+    if isinstance(field, serializers.IntegerField):
+        return int
+    if isinstance(field, serializers.CharField):
+        return six.text_type
+    if isinstance(field, serializers.ReadOnlyField):
+        return lambda value: value
+    return field.to_representation
+
+
+class ExpenseRowSerializer(object):
+    """
+    Read-only fast path of ExpenseSerializer for listings.
+
+    Works on `values()` rows instead of model instances and gives the same
+    representation, so responses are byte-identical.
+    """
+    fields = ExpenseSerializer.Meta.fields
+    values_fields = ('user__username', 'pk', 'date', 'time', 'amount', 'description', 'comment')
+    converters = tuple(
+        get_converter(field) for field in ExpenseSerializer().fields.values())
+
+    def __init__(self, rows, fields=None):
+        self.rows = rows
+        self.columns = [
+            column for column in zip(self.fields, self.values_fields, self.converters)
+            if fields is None or column[0] in fields
+        ]
+
+    @classmethod
+    def get_values_fields(cls, fields=None):
+        """
+        Return the `values()` lookups needed for the given field names.
+        """
+        return tuple(
+            lookup for name, lookup in zip(cls.fields, cls.values_fields)
+            if fields is None or name in fields
+        )
+
+    @classmethod
+    def format_row(cls, row):
+        """
+        Format a `values_list()` row, in `values_fields` order.
+        """
+        return tuple(
+            None if value is None else convert(value)
+            for convert, value in zip(cls.converters, row)
+        )
+
+    @property
+    def data(self):
+        """
+        Representations of `values()` rows, or of `values_list()` rows in
+        `get_values_fields()` order.
+        """
+        names = [name for name, lookup, convert in self.columns]
+        data = []
+        for row in self.rows:
+            if isinstance(row, dict):
+                row = [row[lookup] for name, lookup, convert in self.columns]
+            data.append(OrderedDict(zip(names, [
+                None if value is None else column[2](value)
+                for column, value in zip(self.columns, row)
+            ])))
+        return data
+
+
+class ReportBucketSerializer(serializers.Serializer):
+    """
+    One bucket of a multi-period report.
+    """
+    start = serializers.DateField()
+    end = serializers.DateField()
+    count = serializers.IntegerField()
+    total = serializers.DecimalField(max_digits=16, decimal_places=2)
+    average = serializers.DecimalField(max_digits=16, decimal_places=2)
+    minimum = serializers.DecimalField(max_digits=10, decimal_places=2)
+    maximum = serializers.DecimalField(max_digits=10, decimal_places=2)
+
+
+class UserReportSerializer(serializers.Serializer):
+    """
+    Expense totals of one user in a manager report.
+    """
+    username = serializers.CharField(source='user__username')
+    count = serializers.IntegerField()
+    total = serializers.DecimalField(max_digits=16, decimal_places=2)
+    average = serializers.DecimalField(max_digits=16, decimal_places=2)
+
+
+class JobSerializer(serializers.ModelSerializer):
+    """
+    Job status serializer.
+    """
+    params = serializers.SerializerMethodField()
+    download = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Job
+        fields = (
+            'pk', 'kind', 'status', 'params', 'error',
+            'created_at', 'started_at', 'finished_at', 'download'
+        )
+
+    def get_params(self, obj):
+        return json.loads(obj.params)
+
+    def get_download(self, obj):
+        if obj.status != Job.DONE:
+            return None
+        url = reverse('job_download', kwargs={'username': obj.user.username, 'pk': obj.pk})
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
@@ -0,0 +1,60 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+from expense_trackapp.models import Expense, expenses_changed
+from .authentication import CachedTokenAuthentication, SignedTokenAuthentication
+from . import report_cache
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def invalidate_token(sender, instance, **kwargs):
+    CachedTokenAuthentication.invalidate([instance.key])
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(sender, instance, created, **kwargs):
+    """
+    Cached users carry their active and privilege flags, drop them when
+    the user changes.
+    """
+    if created:
+        return
+    keys = Token.objects.filter(user=instance).values_list('key', flat=True)
+    CachedTokenAuthentication.invalidate(list(keys))
+
+
+# Fields carried by signed tokens or checked when they were issued.
+TOKEN_FIELDS = ('username', 'password', 'is_active', 'is_staff', 'is_superuser')
+
+
+@receiver(pre_save, sender=User)
+def load_token_fields(sender, instance, **kwargs):
+    instance._token_fields = None
+    if instance.pk is not None:
+        instance._token_fields = User.objects.filter(pk=instance.pk).values_list(
+            *TOKEN_FIELDS).first()
+
+
+@receiver(post_save, sender=User)
+def revoke_signed_tokens(sender, instance, created, **kwargs):
+    """
+    Signed tokens cannot be looked up, reject every token issued before
+    the user was deactivated, demoted, renamed or given a new password.
+    """
+    previous = getattr(instance, '_token_fields', None)
+    if created or previous is None:
+        return
+    if previous != tuple(getattr(instance, field) for field in TOKEN_FIELDS):
+        SignedTokenAuthentication.revoke_user(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def revoke_deleted_user_tokens(sender, instance, **kwargs):
+    SignedTokenAuthentication.revoke_user(instance.pk)
+
+
+@receiver(expenses_changed, sender=Expense)
+def invalidate_reports(sender, days, **kwargs):
+    report_cache.invalidate(days)
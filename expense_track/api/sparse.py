@@ -0,0 +1,69 @@
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework.exceptions import ValidationError
+
+
+class SparseFieldsViewMixin(object):
+    """
+    Narrow GET responses to the fields listed in the `fields` query
+    parameter, e.g. `?fields=pk,date,amount`, and load only the columns
+    those fields need.
+    """
+    fields_query_param = 'fields'
+
+    def get_readable_fields(self):
+        return [
+            name for name, field in self.get_serializer_class()().fields.items()
+            if not field.write_only
+        ]
+
+    def get_requested_fields(self):
+        """
+        Return the requested field names, or None for all of them.
+        """
+        if self.request.method != 'GET':
+            return None
+        value = self.request.query_params.get(self.fields_query_param)
+        if not value:
+            return None
+
+        fields = [name.strip() for name in value.split(',') if name.strip()]
+        unknown = set(fields).difference(self.get_readable_fields())
+        if unknown:
+            raise ValidationError(
+                {self.fields_query_param: ['Unknown fields: %s.' % ', '.join(sorted(unknown))]})
+        return fields
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('fields', self.get_requested_fields())
+        return super(SparseFieldsViewMixin, self).get_serializer(*args, **kwargs)
+
+    def sparse_queryset(self, queryset):
+        """
+        Defer the model fields no requested field reads.
+        """
+        fields = self.get_requested_fields()
+        if fields is None:
+            return queryset
+
+        serializer_fields = self.get_serializer_class()().fields
+        opts = queryset.model._meta
+        related, only = set(), set()
+        for name in fields:
+            source = serializer_fields[name].source.split('.')
+            try:
+                field = opts.get_field(source[0])
+            except FieldDoesNotExist:
+                continue
+            if not field.concrete:
+                continue
+            only.add(field.name)
+            # A single level of relations, as in `user.username`.
+            if field.is_relation and len(source) > 1:
+                related.add(field.name)
+                only.add('__'.join(source[:2]))
+
+        # Relations of fields left out are not joined.
+        queryset = queryset.select_related(None)
+        if related:
+            queryset = queryset.select_related(*related)
+        return queryset.only(*only or [opts.pk.name])
@@ -0,0 +1,35 @@
+from base64 import b64decode, b64encode
+from datetime import datetime, timedelta
+from django.utils.six.moves.urllib import parse as urlparse
+from django.utils.timezone import utc
+from rest_framework.exceptions import ValidationError
+
+
+EPOCH = datetime(1970, 1, 1, tzinfo=utc)
+
+# Rows written by transactions that were still open when a cursor was
+# issued carry an earlier updated_at, so every sync looks back this far.
+# Clients apply changes by pk, so seeing a row twice is harmless.
+SYNC_OVERLAP = timedelta(seconds=5)
+
+
+def encode_cursor(moment):
+    """
+    Return an opaque sync cursor for the given aware datetime.
+    """
+    delta = moment - EPOCH
+    microseconds = (delta.days * 86400 + delta.seconds) * 10 ** 6 + delta.microseconds
+    querystring = urlparse.urlencode({'t': microseconds})
+    return b64encode(querystring.encode('ascii')).decode('ascii')
+
+
+def decode_cursor(encoded):
+    """
+    Return the aware datetime of a sync cursor.
+    """
+    try:
+        querystring = b64decode(encoded.encode('ascii')).decode('ascii')
+        tokens = urlparse.parse_qs(querystring)
+        return EPOCH + timedelta(microseconds=int(tokens['t'][0]))
+    except (TypeError, ValueError, KeyError, OverflowError):
+        raise ValidationError({'since': ['Invalid cursor.']})
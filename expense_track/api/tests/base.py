@@ -3,6 +3,8 @@ from datetime import datetime
 from django.test import TestCase
 from django.contrib.auth.models import User
 from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from expense_trackapp.models import Expense
 
 
@@ -103,3 +105,22 @@ class BaseTestCase(TestCase):
         self.assertEqual(response.status_code, expected_status_code)
 
         return manual_data
+
+    def assertQueryBudget(self, request, add_rows, budget=None):
+        """
+        Custom assert that fails if the queries made by `request()` grow
+        after `add_rows()` adds rows, e.g. by loading a relation per row.
+        The request is made once before counting, so caches are warm.
+        If a budget is given, the count must also stay within it.
+        """
+        request()
+        with CaptureQueriesContext(connection) as before:
+            request()
+        add_rows()
+        with CaptureQueriesContext(connection) as after:
+            request()
+
+        queries = '\n'.join(query['sql'] for query in after.captured_queries)
+        self.assertEqual(len(after), len(before), queries)
+        if budget is not None:
+            self.assertLessEqual(len(after), budget, queries)
@@ -1,10 +1,28 @@
+import json
+import os
+import shutil
+import tempfile
 from datetime import timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
 from django.core.urlresolvers import reverse
 from django.contrib.auth.models import User
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.http import http_date
+from django.utils.six import StringIO
 from rest_framework import status
 from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient
-from expense_trackapp.models import Expense
+from expense_trackapp.models import DeletedExpense, Expense, Job
+from mock import patch
+from ..authentication import CachedTokenAuthentication, SignedTokenAuthentication
+from ..cache import TieredCache
+from .. import jobs, report_cache, sync
 from .base import BaseTestCase
 
 
@@ -86,6 +104,692 @@ class AccountTest(BaseTestCase):
             'account_register', 'post', form_data, return_data, status.HTTP_400_BAD_REQUEST)
 
 
+class AuthenticationTest(BaseTestCase):
+    def setUp(self):
+        super(AuthenticationTest, self).setUp()
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        self.url = reverse('expense_list', kwargs={'username': self.user.username})
+
+    def get_token_queries(self):
+        """
+        Make a request and return the queries that read the token table.
+        """
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url)
+        return response, [
+            query for query in context.captured_queries
+            if 'authtoken_token' in query['sql']
+        ]
+
+    def test_cached_token(self):
+        """
+        Warm requests run no authentication queries.
+        """
+
+        response, queries = self.get_token_queries()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(queries), 1)
+
+        response, queries = self.get_token_queries()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(queries, [])
+
+    def test_cached_token_invalidation(self):
+        """
+        Cached credentials are dropped when the token or user changes.
+        """
+
+        self.get_token_queries()
+
+        # Deactivated user.
+        self.user.is_active = False
+        self.user.save()
+        response, queries = self.get_token_queries()
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        # Privilege change is picked up.
+        self.user.is_active = True
+        self.user.save()
+        self.get_token_queries()
+        self.user.is_superuser = True
+        self.user.save()
+        response = self.client.get(reverse(
+            'expense_list', kwargs={'username': self.user2.username}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # Deleted token.
+        self.token.delete()
+        response, queries = self.get_token_queries()
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_cached_token_other_process(self):
+        """
+        Changes made by another process, with its own per-process cache,
+        are seen once the local entry runs out.
+        """
+
+        self.get_token_queries()
+        other_process = dict(settings.CACHES, default={
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'other-process',
+        })
+        with override_settings(CACHES=other_process):
+            self.user.is_active = False
+            self.user.save()
+
+        CachedTokenAuthentication.local_cache.delete(self.token.key)
+        response, queries = self.get_token_queries()
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class SignedTokenTest(BaseTestCase):
+    def setUp(self):
+        super(SignedTokenTest, self).setUp()
+        self.client = APIClient()
+        self.url = reverse('expense_list', kwargs={'username': self.user.username})
+        SignedTokenAuthentication.cutoffs.clear()
+
+    def get_token(self):
+        response = self.client.post(
+            reverse('account_login_signed'), {'username': 'foobar', 'password': 'foobar'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data['token']
+
+    def test_signed_token(self):
+        """
+        Signed token issue and authentication test.
+        """
+
+        # Wrong credentials.
+        response = self.client.post(
+            reverse('account_login_signed'), {'username': 'foobar', 'password': 'foo'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # Warm authentication needs no queries.
+        token = self.get_token()
+        SignedTokenAuthentication().authenticate_credentials(token)
+        with self.assertNumQueries(0):
+            user, payload = SignedTokenAuthentication().authenticate_credentials(token)
+        self.assertEqual((user.pk, user.username), (self.user.pk, 'foobar'))
+
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + token)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 1)
+
+        # Privileges are carried by the token.
+        response = self.client.get(reverse(
+            'expense_list', kwargs={'username': self.user2.username}))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        # Tampered token.
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + token[:-1] + 'x')
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        # Expired token.
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + token)
+        with self.settings(API_SIGNED_TOKEN_MAX_AGE=-1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data, {'detail': 'Token has expired.'})
+
+    def test_signed_token_revoke(self):
+        """
+        Revoked signed tokens are rejected.
+        """
+
+        token = self.get_token()
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + token)
+        response = self.client.delete(reverse('account_login_signed'))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.data, {'detail': 'Token has been revoked.'})
+
+        # Revocations are shared through the cache.
+        SignedTokenAuthentication.revocation_list.clear()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        # Revocations made by another process, with its own per-process
+        # cache, are seen once the local entry runs out.
+        self.client.credentials()
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.get_token())
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        other_process = dict(settings.CACHES, default={
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'other-process',
+        })
+        with override_settings(CACHES=other_process):
+            response = self.client.delete(reverse('account_login_signed'))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        SignedTokenAuthentication.revocation_list.clear()
+        response = self.client.get(self.url)
+        self.assertEqual(response.data, {'detail': 'Token has been revoked.'})
+
+        # Database tokens cannot be revoked here.
+        self.client.credentials(
+            HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=self.user).key)
+        response = self.client.delete(reverse('account_login_signed'))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_signed_token_user_changes(self):
+        """
+        Signed tokens are rejected once their user is deactivated, demoted
+        or deleted, in every process.
+        """
+
+        self.user.is_staff = True
+        self.user.save()
+        token = self.get_token()
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + token)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # Saves that leave the token fields alone keep tokens valid.
+        self.user.first_name = 'Foo'
+        self.user.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # Demoted.
+        self.user.is_staff = False
+        self.user.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response.data, {'detail': 'Token has been revoked.'})
+
+        # A process without the cutoff in its memory reads it from the
+        # shared cache, or the database.
+        SignedTokenAuthentication.cutoffs.clear()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        SignedTokenAuthentication.cutoffs.clear()
+        caches['shared'].clear()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        # Tokens issued after the change are accepted.
+        self.client.credentials()
+        token = self.get_token()
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + token)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # Deactivated.
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        # Deleted.
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + SignedTokenAuthentication.issue(self.user2))
+        url = reverse('expense_list', kwargs={'username': self.user2.username})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.user2.delete()
+        response = self.client.get(url)
+        self.assertEqual(response.data, {'detail': 'Token has been revoked.'})
+
+
+class ConditionalGetTest(BaseTestCase):
+    def setUp(self):
+        super(ConditionalGetTest, self).setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('expense_list', kwargs={'username': self.user.username})
+
+    def get_expense_queries(self, url, **headers):
+        """
+        Make a request and return the queries that read the expense table.
+        """
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, **headers)
+        return response, [
+            query for query in context.captured_queries
+            if 'expense_trackapp_expense' in query['sql']
+        ]
+
+    def test_conditional_get(self):
+        """
+        Unchanged expenses are answered with 304 without reading them.
+        """
+
+        detail_url = reverse('expense_detail', kwargs={
+            'username': self.user.username, 'pk': self.expense.pk})
+        report_url = reverse('report_detail', kwargs={
+            'username': self.user.username, 'week': self.now.date().isocalendar()[1]})
+
+        for url in (self.url, detail_url, report_url):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertIn('private', response['Cache-Control'])
+            self.assertFalse(response.has_header('Last-Modified'))
+            etag = response['ETag']
+
+            response, queries = self.get_expense_queries(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+            self.assertEqual(queries, [])
+
+        # Dates are too coarse to tell writes in the same second apart, so
+        # only ETags are used.
+        Expense.objects.create(user=self.user, amount=1)
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=http_date())
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_etag_changes(self):
+        """
+        ETags change with the user's expenses only.
+        """
+
+        etag = self.client.get(self.url)['ETag']
+
+        # Other users' writes keep the ETag.
+        self.expense2.amount = 1
+        self.expense2.save()
+        Expense.objects.filter(user=self.user2).delete()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # Own writes, including bulk ones, change it.
+        for write in (
+                lambda: Expense.objects.filter(user=self.user).update(comment='foo'),
+                lambda: Expense.objects.create(user=self.user, amount=1),
+                lambda: Expense.objects.filter(user=self.user).delete()):
+            write()
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            etag = response['ETag']
+
+        # Superusers follow every user's writes.
+        self.user.is_superuser = True
+        etag = self.client.get(self.url)['ETag']
+        Expense.objects.create(user=self.user2, amount=1)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_etag_changes_across_processes(self):
+        """
+        A write made by another process, with its own per-process cache,
+        changes the ETag.
+        """
+
+        etag = self.client.get(self.url)['ETag']
+
+        other_process = dict(settings.CACHES, default={
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'other-process',
+        })
+        with override_settings(CACHES=other_process):
+            Expense.objects.create(user=self.user, amount=1)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class ReportCacheTest(BaseTestCase):
+    def setUp(self):
+        super(ReportCacheTest, self).setUp()
+        caches['shared'].clear()
+        report_cache.report_cache.local_cache.clear()
+        report_cache.report_cache.reset_stats()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('report_summary', kwargs={'username': self.user.username})
+        self.params = {'period': 'week', 'start': '2016-01-01', 'end': '2016-12-31'}
+        self.expense3 = Expense.objects.create(
+            amount=100, user=self.user, date='2016-01-04', time=self.now.time())
+
+    def get_summary(self):
+        """
+        Return the report buckets and the number of expense queries run.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, self.params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data['buckets'], len([
+            query for query in queries.captured_queries
+            if 'expense_trackapp_expense' in query['sql']])
+
+    def test_report_cache(self):
+        buckets, queries = self.get_summary()
+        self.assertEqual(queries, 1)
+        self.assertEqual(buckets[1]['count'], 1)
+
+        # The partial first and last weeks are never cached.
+        buckets, queries = self.get_summary()
+        self.assertEqual(queries, 1)
+        stats = report_cache.report_cache.get_stats()
+        self.assertEqual((stats['hits'], stats['misses']), (51, 51))
+
+        # A year of weeks, all cached.
+        self.params.update(start='2016-01-04', end='2017-01-01')
+        self.get_summary()
+        buckets, queries = self.get_summary()
+        self.assertEqual(queries, 0)
+
+        # Writes drop the buckets of the weeks they touch, and only those.
+        Expense.objects.create(amount=50, user=self.user, date='2016-03-01', time=self.now.time())
+        report_cache.report_cache.reset_stats()
+        buckets, queries = self.get_summary()
+        self.assertEqual(queries, 1)
+        self.assertEqual(report_cache.report_cache.get_stats()['misses'], 1)
+        self.assertEqual(buckets[8]['total'], '50.00')
+
+        self.expense3.date = '2016-02-01'
+        self.expense3.save()
+        buckets, queries = self.get_summary()
+        self.assertEqual(queries, 1)
+        self.assertEqual((buckets[0]['count'], buckets[4]['count']), (0, 1))
+
+        Expense.objects.filter(user=self.user).update(amount=10)
+        buckets, queries = self.get_summary()
+        self.assertEqual((buckets[4]['total'], buckets[8]['total']), ('10.00', '10.00'))
+
+        Expense.objects.filter(user=self.user).delete()
+        buckets, queries = self.get_summary()
+        self.assertEqual(sum(bucket['count'] for bucket in buckets), 0)
+
+        # Other users' writes leave the buckets alone.
+        Expense.objects.create(amount=1, user=self.user2, date='2016-03-01', time=self.now.time())
+        buckets, queries = self.get_summary()
+        self.assertEqual(queries, 0)
+
+    def test_report_cache_other_process(self):
+        """
+        Writes made in one process reach the buckets cached by another, whose
+        local tier is not told about them.
+        """
+
+        self.params.update(start='2016-01-04', end='2017-01-01')
+        other = TieredCache('report', settings.REPORT_CACHE_TIMEOUT)
+        self.get_summary()
+
+        # Buckets computed here are served to the other process.
+        with patch.object(report_cache, 'report_cache', other):
+            buckets, queries = self.get_summary()
+        self.assertEqual(queries, 0)
+        self.assertEqual(other.get_stats()['local_hits'], 0)
+        with patch.object(report_cache, 'report_cache', other):
+            self.get_summary()
+        self.assertEqual(other.get_stats()['local_hits'], 52)
+
+        # Only this process sees the write.
+        Expense.objects.create(amount=50, user=self.user, date='2016-03-01', time=self.now.time())
+        with patch.object(report_cache, 'report_cache', other):
+            buckets, queries = self.get_summary()
+        self.assertEqual(queries, 1)
+        self.assertEqual(buckets[8]['total'], '50.00')
+
+    def test_report_cache_write_during_report(self):
+        """
+        Buckets computed before a write are not cached once it is
+        invalidated.
+        """
+
+        self.params.update(start='2016-01-04', end='2017-01-01')
+        set_many = report_cache.UserReportCache.set_many
+
+        def write_then_set_many(user_cache, values):
+            Expense.objects.create(
+                amount=50, user=self.user, date='2016-03-01', time=self.now.time())
+            set_many(user_cache, values)
+
+        with patch.object(report_cache.UserReportCache, 'set_many', write_then_set_many):
+            buckets, queries = self.get_summary()
+        self.assertEqual(buckets[8]['total'], '0.00')
+
+        buckets, queries = self.get_summary()
+        self.assertEqual(queries, 1)
+        self.assertEqual(buckets[8]['total'], '50.00')
+
+    def test_report_cache_disabled(self):
+        with override_settings(REPORT_CACHE=False):
+            self.get_summary()
+            buckets, queries = self.get_summary()
+        self.assertEqual(queries, 1)
+        self.assertEqual(report_cache.report_cache.get_stats()['hits'], 0)
+
+    def test_report_cache_lock(self):
+        with override_settings(REPORT_CACHE_LOCK=True):
+            buckets, queries = self.get_summary()
+            self.assertEqual(buckets[1]['count'], 1)
+            buckets, queries = self.get_summary()
+        self.assertEqual(queries, 1)
+        # Released locks are dropped from the shared cache.
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT cache_key FROM expense_track_cache WHERE cache_key LIKE %s',
+                ['%report-lock%'])
+            self.assertEqual(cursor.fetchall(), [])
+
+    def test_report_cache_stats(self):
+        url = reverse('user_report_cache')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.user.is_staff = True
+        self.user.save()
+        self.get_summary()
+        self.get_summary()
+        response = self.client.get(url)
+        self.assertEqual(response.data['hits'], 51)
+        self.assertEqual(response.data['misses'], 51)
+        self.assertEqual(response.data['hit_ratio'], 0.5)
+        self.assertTrue(response.data['enabled'])
+
+
+class SyncTest(BaseTestCase):
+    def setUp(self):
+        super(SyncTest, self).setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('expense_list', kwargs={'username': self.user.username})
+
+    def get_changes(self, cursor):
+        response = self.client.get(self.url, {'since': cursor})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_sync(self):
+        """
+        Changes since a cursor test.
+        """
+
+        response = self.client.get(self.url)
+        cursor = response.data['cursor']
+
+        # Rows older than the overlap window are not sent again.
+        old = timezone.now() - timedelta(minutes=1)
+        Expense.objects.update(updated_at=old)
+        changes = self.get_changes(sync.encode_cursor(old + timedelta(seconds=30)))
+        self.assertEqual((changes['changed'], changes['deleted']), ([], []))
+
+        created = Expense.objects.create(user=self.user, amount=1)
+        Expense.objects.filter(pk=self.expense.pk).update(comment='foo')
+        Expense.objects.filter(user=self.user2).delete()
+        changes = self.get_changes(cursor)
+        self.assertEqual(
+            [(expense['pk'], expense['comment']) for expense in changes['changed']],
+            [(created.pk, ''), (self.expense.pk, 'foo')])
+        self.assertEqual(changes['deleted'], [])
+
+        # Deletes are reported to the owner.
+        deleted = sorted([created.pk, self.expense.pk])
+        created.delete()
+        Expense.objects.filter(pk=self.expense.pk).delete()
+        changes = self.get_changes(changes['cursor'])
+        self.assertEqual(changes['changed'], [])
+        self.assertEqual(changes['deleted'], deleted)
+
+        # Admins see every user's deletes.
+        self.user.is_superuser = True
+        changes = self.get_changes(cursor)
+        self.assertEqual(changes['deleted'], sorted(deleted + [self.expense2.pk]))
+
+    def test_sync_cursor(self):
+        """
+        Invalid and expired cursors test.
+        """
+
+        response = self.client.get(self.url, {'since': 'foo'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        expired = timezone.now() - timedelta(seconds=settings.EXPENSE_TOMBSTONE_MAX_AGE + 60)
+        response = self.client.get(self.url, {'since': sync.encode_cursor(expired)})
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+
+        # Old tombstones are pruned.
+        self.expense.delete()
+        DeletedExpense.objects.update(deleted_at=expired)
+        stdout = StringIO()
+        call_command('prune_tombstones', stdout=stdout)
+        self.assertEqual(stdout.getvalue().strip(), 'Pruned 1 tombstones.')
+        self.assertFalse(DeletedExpense.objects.exists())
+
+
+class InstrumentationTest(BaseTestCase):
+    def setUp(self):
+        super(InstrumentationTest, self).setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('expense_list', kwargs={'username': self.user.username})
+
+    def test_disabled(self):
+        """
+        Instrumentation is off by default.
+        """
+
+        response = self.client.get(self.url)
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    @override_settings(SQL_INSTRUMENTATION=True, SQL_INSTRUMENTATION_SUMMARY_INTERVAL=2)
+    def test_instrumentation(self):
+        """
+        Server-Timing header and structured log test.
+        """
+
+        with patch('api.middleware.logger') as logger:
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(self.url)
+            self.client.get(self.url)
+
+        self.assertIn('sql;dur=', response['Server-Timing'])
+        self.assertIn(
+            'desc="%s queries"' % len(context.captured_queries), response['Server-Timing'])
+        self.assertIn('view;dur=', response['Server-Timing'])
+
+        record = json.loads(logger.info.call_args_list[0][0][0])
+        self.assertEqual(record['url_name'], 'expense_list')
+        self.assertEqual(record['queries'], len(context.captured_queries))
+        self.assertEqual(record['status'], 200)
+        self.assertIn(
+            record['slowest_sql'], [query['sql'][:200] for query in context.captured_queries])
+
+        # Every second request logs the totals per URL name.
+        summary = json.loads(logger.info.call_args_list[-1][0][0])['summary']
+        self.assertEqual(summary['expense_list']['requests'], 2)
+
+
+@override_settings(REPORT_CACHE=False)
+class JobTest(BaseTestCase):
+    def setUp(self):
+        super(JobTest, self).setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('job_list', kwargs={'username': self.user.username})
+        self.result_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.result_dir)
+        self.settings = override_settings(JOB_RESULT_DIR=self.result_dir)
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+
+    def submit(self, data):
+        response = self.client.post(self.url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED, response.data)
+        self.assertEqual(response.data['status'], Job.QUEUED)
+        return response.data['pk']
+
+    def get_job(self, pk, url_name='job_detail'):
+        return self.client.get(reverse(
+            url_name, kwargs={'username': self.user.username, 'pk': pk}))
+
+    def test_export_job(self):
+        Expense.objects.create(amount=5, user=self.user, date='2016-01-04', time=self.now.time())
+        pk = self.submit(
+            {'kind': 'export', 'format': 'csv', 'date_0': '2016-01-01', 'date_1': '2016-12-31'})
+
+        response = self.get_job(pk, 'job_download')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+        jobs.run_job(jobs.claim_job('worker'))
+        response = self.get_job(pk)
+        self.assertEqual(response.data['status'], Job.DONE)
+        self.assertEqual(response.data['params'], {
+            'format': 'csv', 'filters': {'date_0': '2016-01-01', 'date_1': '2016-12-31'}})
+        self.assertTrue(response.data['download'].endswith(
+            reverse('job_download', kwargs={'username': self.user.username, 'pk': pk})))
+
+        response = self.get_job(pk, 'job_download')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual(lines[0], 'user,pk,date,time,amount,description,comment')
+        self.assertEqual(len(lines), 2)
+        self.assertIn('2016-01-04', lines[1])
+
+        # A result lost from JOB_RESULT_DIR is gone.
+        os.remove(os.path.join(self.result_dir, Job.objects.get(pk=pk).result_name))
+        response = self.get_job(pk, 'job_download')
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+
+    def test_report_job(self):
+        Expense.objects.create(amount=5, user=self.user, date='2016-01-04', time=self.now.time())
+        pk = self.submit(
+            {'kind': 'report', 'period': 'month', 'start': '2016-01-01', 'end': '2016-12-31'})
+        jobs.run_job(jobs.claim_job('worker'))
+
+        response = self.get_job(pk, 'job_download')
+        self.assertEqual(response['Content-Type'], 'application/json')
+        report = json.loads(b''.join(response.streaming_content).decode('utf-8'))
+        summary = self.client.get(
+            reverse('report_summary', kwargs={'username': self.user.username}),
+            {'period': 'month', 'start': '2016-01-01', 'end': '2016-12-31'})
+        self.assertEqual(report, json.loads(summary.content.decode('utf-8')))
+        self.assertEqual(report['buckets'][0]['count'], 1)
+
+    def test_failed_job(self):
+        job = Job.objects.create(user=self.user, kind=Job.EXPORT, params='{"format": "xml"}')
+        with patch('api.jobs.logger') as logger:
+            jobs.run_job(jobs.claim_job('worker'))
+        self.assertTrue(logger.exception.called)
+        response = self.get_job(job.pk)
+        self.assertEqual(response.data['status'], Job.FAILED)
+        self.assertTrue(response.data['error'])
+        self.assertIsNone(response.data['download'])
+
+    def test_invalid_jobs(self):
+        for data in [
+                {'kind': 'backup'},
+                {'kind': 'export', 'format': 'xml'},
+                {'kind': 'export', 'format': 'csv', 'amount_0': 'lots'},
+                {'kind': 'report', 'period': 'decade'},
+                {'kind': 'report', 'start': '2016-02-01', 'end': '2016-01-01'}]:
+            response = self.client.post(self.url, data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, data)
+        self.assertFalse(Job.objects.exists())
+
+    def test_job_permissions(self):
+        job = Job.objects.create(user=self.user2, kind=Job.EXPORT, params='{}')
+        response = self.get_job(job.pk)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(
+            reverse('job_detail', kwargs={'username': self.user2.username, 'pk': job.pk}))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
 class ExpensesTest(BaseTestCase):
     def setUp(self):
         super(ExpensesTest, self).setUp()
@@ -329,6 +1033,212 @@ class ExpensesTest(BaseTestCase):
             query_params=query_params
         )
 
+    def test_list_pagination(self):
+        """
+        Cursor paginated expense list test.
+        """
+
+        url = reverse('expense_list', kwargs={'username': self.user.username})
+        expense4 = Expense.objects.create(
+            amount=float(111), user=self.user, date=self.now.date(), time=self.now.time())
+        expense5 = Expense.objects.create(
+            amount=float(666), user=self.user, date=self.now.date(), time=self.now.time())
+
+        # Pages follow date, amount and pk ordering.
+        expected = [self.expense3.pk, expense4.pk, self.expense.pk, expense5.pk]
+        pks, previous = [], []
+        response = self.client.get(url, {'page_size': 3})
+        self.assertIsNone(response.data['previous'])
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            pks.extend([expense['pk'] for expense in response.data['results']])
+            if not response.data['next']:
+                break
+            previous.append(response.data['next'])
+            response = self.client.get(response.data['next'])
+        self.assertEqual(pks, expected)
+
+        # Previous link walks back to the first page.
+        response = self.client.get(response.data['previous'])
+        self.assertEqual(
+            [expense['pk'] for expense in response.data['results']], expected[:3])
+        self.assertIsNone(response.data['previous'])
+
+        # Cursors keep working with filters.
+        response = self.client.get(url, {'page_size': 1, 'amount_0': '500'})
+        self.assertEqual(response.data['results'][0]['pk'], self.expense.pk)
+        response = self.client.get(response.data['next'])
+        self.assertEqual(response.data['results'][0]['pk'], expense5.pk)
+        self.assertIsNone(response.data['next'])
+
+        # Invalid cursor.
+        response = self.client.get(url, {'cursor': 'foobar'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_query_budget(self):
+        """
+        Listing queries do not grow with the number of expenses.
+        """
+
+        self.user.is_superuser = True
+        self.user.save()
+        kwargs = {'username': self.user.username}
+        users = [self.user, self.user2]
+        since = sync.encode_cursor(timezone.now() - timedelta(minutes=1))
+
+        def add_rows():
+            users.append(User.objects.create_user(
+                username='budget%s' % len(users), email='budget%s@bar.com' % len(users)))
+            Expense.objects.bulk_create([
+                Expense(amount=index, user=users[index % len(users)])
+                for index in range(10)
+            ])
+
+        def get(url_name, params=None, url_kwargs=kwargs):
+            def request():
+                response = self.client.get(reverse(url_name, kwargs=url_kwargs), params)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+            return request
+
+        requests = [
+            get('expense_list'),
+            get('expense_list', {'since': since}),
+            get('expense_table'),
+            get('expense_export', url_kwargs=dict(kwargs, export_format='csv')),
+            get('expense_detail', url_kwargs=self.user1_url_kwargs),
+            get('user_list', url_kwargs=None),
+        ]
+        for request in requests:
+            self.assertQueryBudget(request, add_rows, budget=4)
+
+    def test_list_page_numbers(self):
+        """
+        Page number listings with estimated counts test.
+        """
+
+        caches['shared'].clear()
+        self.user.is_superuser = True
+        self.user.save()
+        url = reverse('expense_list', kwargs={'username': self.user.username})
+
+        response = self.client.get(url, {'page': 1, 'page_size': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 3)
+        self.assertTrue(response.data['approximate'])
+        self.assertEqual(
+            [expense['pk'] for expense in response.data['results']],
+            [self.expense3.pk, self.expense.pk])
+        self.assertIsNotNone(response.data['next'])
+
+        # Filtered listings are counted exactly.
+        response = self.client.get(url, {'page': 1, 'amount_0': '500'})
+        self.assertEqual(response.data['count'], 2)
+        self.assertFalse(response.data['approximate'])
+
+    def test_sparse_fields(self):
+        """
+        Sparse fieldsets test.
+        """
+
+        url = reverse('expense_list', kwargs={'username': self.user.username})
+        response = self.client.get(url, {'fields': 'pk,amount'})
+        self.assertEqual(
+            [dict(expense) for expense in response.data['results']],
+            [
+                {'pk': self.expense3.pk, 'amount': '333.00'},
+                {'pk': self.expense.pk, 'amount': '666.00'},
+            ])
+
+        # Only the needed columns are read.
+        url = reverse('expense_detail', kwargs=self.user1_url_kwargs)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, {'fields': 'user,date'})
+        self.assertEqual(
+            dict(response.data), {'user': 'foobar', 'date': str(self.now.date())})
+        sql = [
+            query['sql'] for query in context.captured_queries
+            if 'expense_trackapp_expense' in query['sql']
+        ]
+        self.assertEqual(len(sql), 1)
+        self.assertNotIn('description', sql[0])
+
+        response = self.client.get(url, {'fields': 'pk,foo'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {'fields': ['Unknown fields: foo.']})
+
+        # Users.
+        self.user.is_superuser = True
+        self.user.save()
+        response = self.client.get(reverse('user_list'), {'fields': 'username'})
+        self.assertEqual(
+            sorted(dict(user) for user in response.data),
+            [{'username': 'foobar'}, {'username': 'foobar2'}])
+
+        # Write-only fields cannot be requested.
+        response = self.client.get(reverse('user_list'), {'fields': 'password'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_table(self):
+        """
+        DataTables server-side expense table test.
+        """
+
+        url = reverse('expense_table', kwargs={'username': self.user.username})
+        Expense.objects.filter(pk=self.expense3.pk).update(comment='Lunch', amount=700)
+        params = {
+            'draw': '3',
+            'start': '0',
+            'length': '1',
+            'columns[0][data]': 'date',
+            'columns[1][data]': 'amount',
+            'columns[2][data]': 'comment',
+            'order[0][column]': '0',
+            'order[0][dir]': 'desc',
+            'search[value]': '',
+        }
+
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['draw'], 3)
+        self.assertEqual(response.data['recordsTotal'], 2)
+        self.assertEqual(response.data['recordsFiltered'], 2)
+        self.assertEqual(response.data['data'], [self.expense_return_data])
+
+        # Second page, ascending.
+        params.update({'start': '1', 'order[0][dir]': 'asc'})
+        response = self.client.get(url, params)
+        self.assertEqual(
+            [expense['pk'] for expense in response.data['data']], [self.expense.pk])
+
+        # Sorted by amount.
+        params.update({'order[0][column]': '1'})
+        response = self.client.get(url, params)
+        self.assertEqual(
+            [expense['pk'] for expense in response.data['data']], [self.expense3.pk])
+
+        # Unsortable columns fall back to date.
+        params.update({'order[0][column]': '2'})
+        response = self.client.get(url, params)
+        self.assertEqual(
+            [expense['pk'] for expense in response.data['data']], [self.expense.pk])
+
+        # Search and ExpenseFilter parameters narrow the rows.
+        params.update({'start': '0', 'length': '-1', 'search[value]': 'lunch'})
+        response = self.client.get(url, params)
+        self.assertEqual(response.data['recordsFiltered'], 1)
+        self.assertEqual(
+            [expense['pk'] for expense in response.data['data']], [self.expense3.pk])
+
+        params.update({'search[value]': '', 'amount_0': '500', 'amount_1': '680'})
+        response = self.client.get(url, params)
+        self.assertEqual(
+            [expense['pk'] for expense in response.data['data']], [self.expense.pk])
+
+        response = self.client.get(url, {'start': 'foo'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_detail(self):
         """
         Single expense test.
@@ -447,6 +1357,61 @@ class ExpensesTest(BaseTestCase):
             url_kwargs=self.user1_url_kwargs,
         )
 
+    def test_batch_create(self):
+        """
+        Batch create expenses test.
+        """
+
+        url = reverse('expense_batch', kwargs={'username': self.user.username})
+        items = [
+            {'amount': '10.00', 'date': '2017-01-01', 'time': '10:00'},
+            {'amount': '20.00', 'date': '2017-01-02', 'comment': 'foo'},
+        ]
+
+        # User can create only its own records.
+        response = self.client.post(url, items, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data, {'count': 2})
+        self.assertEqual(
+            list(Expense.objects.filter(user=self.user, date__year=2017).values_list(
+                'amount', 'comment', 'iso_week')),
+            [(Decimal('10.00'), '', 52), (Decimal('20.00'), 'foo', 1)]
+        )
+        response = self.client.post(reverse(
+            'expense_batch', kwargs={'username': self.user2.username}), items, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        # Errors are reported per item and nothing is saved.
+        count = Expense.objects.count()
+        response = self.client.post(url, items + [{'date': 'foo'}], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[:2], [{}, {}])
+        self.assertEqual(sorted(response.data[2]), ['amount', 'date'])
+        self.assertEqual(Expense.objects.count(), count)
+
+        # Batch must be a bounded list.
+        response = self.client.post(url, items[0], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(url, items * 2501, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # Admin can create records for any user.
+        self.user.is_superuser = True
+        self.user.save()
+        items = [
+            {'amount': '30.00', 'user': 'foobar2'},
+            {'amount': '40.00'},
+            {'amount': '50.00', 'user': 'foobar3'},
+        ]
+        response = self.client.post(url, items, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, [{}, {}, {'user': ['User does not exist.']}])
+
+        response = self.client.post(url, items[:2], format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(Expense.objects.filter(user=self.user2, amount=30).exists())
+        self.assertTrue(Expense.objects.filter(user=self.user, amount=40).exists())
+
     def test_update(self):
         """
         Update expense test.
@@ -540,6 +1505,230 @@ class ExpensesTest(BaseTestCase):
             url_kwargs=self.user2_url_kwargs,
         )
 
+    def test_bulk_update(self):
+        """
+        Bulk update expenses test.
+        """
+
+        url = reverse('expense_list', kwargs={'username': self.user.username})
+
+        # Update by ids, other users' expenses are left alone.
+        form_data = {
+            'ids': [self.expense.pk, self.expense2.pk, self.expense3.pk],
+            'comment': 'foo'
+        }
+        response = self.client.patch(url, form_data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'count': 2})
+        self.assertEqual(
+            list(Expense.objects.filter(comment='foo').order_by('pk')),
+            [self.expense, self.expense3]
+        )
+
+        # Update by filter, moving dates keeps derived columns in sync.
+        response = self.client.patch(
+            url + '?amount_0=500', {'date': '2017-01-01'}, format='json')
+        self.assertEqual(response.data, {'count': 1})
+        expense = Expense.objects.get(pk=self.expense.pk)
+        self.assertEqual((expense.iso_year, expense.iso_week), (2016, 52))
+
+        # Invalid requests.
+        response = self.client.patch(url, {'comment': 'foo'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.patch(url, {'ids': ['foo'], 'comment': 'foo'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.patch(url + '?ids=1', {'amount': 'foo'}, format='json')
+        self.assertEqual(response.data, {'amount': ['A valid number is required.']})
+        response = self.client.patch(url + '?ids=1', {}, format='json')
+        self.assertEqual(response.data, {'detail': 'No fields to update.'})
+        response = self.client.patch(url + '?ids=1', [{'comment': 'foo'}], format='json')
+        self.assertEqual(
+            response.data, {'detail': 'Expected an object of fields to update.'})
+        response = self.client.patch(reverse(
+            'expense_list', kwargs={'username': self.user2.username}),
+            {'ids': [self.expense2.pk], 'comment': 'foo'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_bulk_delete(self):
+        """
+        Bulk delete expenses test.
+        """
+
+        url = reverse('expense_list', kwargs={'username': self.user.username})
+
+        # Delete by ids.
+        response = self.client.delete(
+            url, {'ids': [self.expense.pk, self.expense2.pk]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'count': 1})
+        self.assertFalse(Expense.objects.filter(pk=self.expense.pk).exists())
+
+        # A selection is required.
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # Admin can delete by filter across users.
+        self.user.is_superuser = True
+        self.user.save()
+        response = self.client.delete(url + '?amount_0=300&amount_1=1000')
+        self.assertEqual(response.data, {'count': 2})
+        self.assertFalse(Expense.objects.exists())
+
+    def test_export(self):
+        """
+        Streaming expense export test.
+        """
+
+        self.expense.description = u'\u010devapi, "grill"'
+        self.expense.save()
+        self.expense_return_data['description'] = self.expense.description
+        kwargs = {'username': self.user.username}
+
+        # CSV export.
+        response = self.client.get(
+            reverse('expense_export', kwargs=dict(kwargs, export_format='csv')))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual(lines[0], 'user,pk,date,time,amount,description,comment')
+        self.assertEqual(lines[2], u'foobar,%s,%s,%s,666.00,"\u010devapi, ""grill""",' % (
+            self.expense.pk, self.now.date(), self.now.time().isoformat()))
+        self.assertEqual(len(lines), 3)
+
+        # NDJSON export matches the serializer output.
+        response = self.client.get(
+            reverse('expense_export', kwargs=dict(kwargs, export_format='ndjson')),
+            {'amount_0': '500'})
+        lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual([json.loads(line) for line in lines], [self.expense_return_data])
+
+    def test_report(self):
+        """
+        Weekly report test.
+        """
+
+        week = self.now.date().isocalendar()[1]
+        amounts = [
+            expense.amount for expense in Expense.objects.filter(user=self.user)
+            if expense.date.isocalendar()[1] == week
+        ]
+        total = sum(amounts)
+        report = 'Weekly report:\n \tTotal: %s\n\tAverage: %s\n' % (
+            total, (total / len(amounts)).quantize(Decimal('0.01')))
+
+        response = self.client.get(reverse(
+            'report_detail', kwargs={'username': self.user.username, 'week': week}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, report)
+
+        # Explicit year.
+        year = self.now.date().isocalendar()[0]
+        response = self.client.get(reverse(
+            'report_detail',
+            kwargs={'username': self.user.username, 'year': year, 'week': week}))
+        self.assertEqual(response.data, report)
+
+        # Empty week.
+        response = self.client.get(reverse(
+            'report_detail',
+            kwargs={'username': self.user.username, 'year': year - 1, 'week': week}))
+        self.assertEqual(
+            response.data, 'Weekly report:\n \tTotal: None\n\tAverage: None\n')
+
+        # Without a year the week is of the current year, and so is the ETag.
+        url = reverse('report_detail', kwargs={'username': self.user.username, 'week': week})
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        with patch('api.views.get_current_date', return_value=self.now.date() + timedelta(weeks=53)):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data, 'Weekly report:\n \tTotal: None\n\tAverage: None\n')
+
+    def test_report_summary(self):
+        """
+        Multi-period report test.
+        """
+        caches['shared'].clear()
+        report_cache.report_cache.local_cache.clear()
+        for day, amount in [
+                ('2016-01-04', 100), ('2016-01-05', 50),
+                ('2016-03-31', 30), ('2016-11-15', 20)]:
+            Expense.objects.create(amount=amount, user=self.user, date=day, time=self.now.time())
+        Expense.objects.create(amount=1, user=self.user2, date='2016-01-04', time=self.now.time())
+        url = reverse('report_summary', kwargs={'username': self.user.username})
+
+        def get_summary(**params):
+            response = self.client.get(url, params)
+            return response.status_code, json.loads(response.content.decode())
+
+        params = {'start': '2016-01-01', 'end': '2016-12-31'}
+        with CaptureQueriesContext(connection) as queries:
+            status_code, data = get_summary(period='week', **params)
+        self.assertEqual(status_code, status.HTTP_200_OK)
+        self.assertEqual(len([
+            query for query in queries.captured_queries
+            if 'expense_trackapp_expense' in query['sql']]), 1)
+        # January 1st 2016 falls into the last ISO week of 2015.
+        self.assertEqual(len(data['buckets']), 53)
+        self.assertEqual(data['buckets'][0]['start'], '2015-12-28')
+        self.assertEqual(data['buckets'][1], {
+            'start': '2016-01-04', 'end': '2016-01-10', 'count': 2, 'total': '150.00',
+            'average': '75.00', 'minimum': '50.00', 'maximum': '100.00'})
+        self.assertEqual(data['buckets'][2], {
+            'start': '2016-01-11', 'end': '2016-01-17', 'count': 0, 'total': '0.00',
+            'average': None, 'minimum': None, 'maximum': None})
+
+        status_code, data = get_summary(period='quarter', **params)
+        self.assertEqual(
+            [(bucket['start'], bucket['count'], bucket['total']) for bucket in data['buckets']],
+            [('2016-01-01', 3, '180.00'), ('2016-04-01', 0, '0.00'),
+             ('2016-07-01', 0, '0.00'), ('2016-10-01', 1, '20.00')])
+        self.assertEqual(data['buckets'][0]['average'], '60.00')
+
+        status_code, data = get_summary(period='month', **params)
+        self.assertEqual(
+            [bucket['count'] for bucket in data['buckets']], [2, 0, 1] + [0] * 7 + [1, 0])
+        self.assertEqual(data['buckets'][1]['end'], '2016-02-29')
+
+        status_code, data = get_summary(period='year', start='2015-06-01', end='2016-12-31')
+        self.assertEqual(
+            [(bucket['start'], bucket['count']) for bucket in data['buckets']],
+            [('2015-01-01', 0), ('2016-01-01', 4)])
+
+        status_code, data = get_summary(period='day', start='2016-01-03', end='2016-01-05')
+        self.assertEqual([bucket['count'] for bucket in data['buckets']], [0, 1, 1])
+
+        # Last 52 weeks by default.
+        status_code, data = get_summary()
+        self.assertEqual(data['period'], 'week')
+        self.assertEqual(data['end'], str(self.now.date()))
+        self.assertEqual(sum(bucket['count'] for bucket in data['buckets']), 2)
+
+        for params in [
+                {'period': 'decade'},
+                {'start': '2016-02-01', 'end': '2016-01-01'},
+                {'start': 'yesterday'},
+                {'period': 'day', 'start': '2010-01-01', 'end': '2016-01-01'}]:
+            status_code, data = get_summary(**params)
+            self.assertEqual(status_code, status.HTTP_400_BAD_REQUEST)
+
+        # Defaulted ranges follow the current date, their ETag too.
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        with patch('api.views.get_current_date', return_value=self.now.date() + timedelta(days=7)):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['end'], self.now.date() + timedelta(days=7))
+
+        # Missing users are not found, even by superusers.
+        self.user.is_superuser = True
+        self.user.save()
+        response = self.client.get(reverse('report_summary', kwargs={'username': 'nobody'}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
 
 class UsersTest(BaseTestCase):
     def setUp(self):
@@ -610,6 +1799,54 @@ class UsersTest(BaseTestCase):
             status.HTTP_200_OK,
         )
 
+    def test_report(self):
+        """
+        Manager report test.
+        """
+        url = reverse('user_report')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.user.is_staff = True
+        self.user.save()
+
+        # Current week by default.
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(row['username'], row['count'], row['total']) for row in response.data['results']],
+            [('foobar', 1, '666.00'), ('foobar2', 1, '999.00')])
+
+        user3 = User.objects.create_user(username='report3')
+        for user, amounts in [(self.user, [10, 20]), (self.user2, [100]), (user3, [5, 5, 50])]:
+            for amount in amounts:
+                Expense.objects.create(
+                    amount=amount, user=user, date='2016-03-01', time=self.now.time())
+
+        params = {'start': '2016-01-01', 'end': '2016-12-31', 'ordering': '-total'}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        # The page and its count.
+        self.assertEqual(len([
+            query for query in queries.captured_queries
+            if 'expense_trackapp_expense' in query['sql']]), 2)
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual(
+            [(row['username'], row['count'], row['total'], row['average'])
+             for row in response.data['results']],
+            [('foobar2', 1, '100.00', '100.00'), ('report3', 3, '60.00', '20.00'),
+             ('foobar', 2, '30.00', '15.00')])
+
+        params.update(ordering='username', page_size=2, page=2)
+        response = self.client.get(url, params)
+        self.assertEqual(
+            [row['username'] for row in response.data['results']], ['report3'])
+        self.assertIsNotNone(response.data['previous'])
+
+        for params in [{'ordering': 'count'}, {'start': 'never'}]:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_detail(self):
         """
         Single user test.
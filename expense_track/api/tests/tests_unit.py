@@ -1,10 +1,35 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from itertools import combinations
+from unittest import skipUnless
 from .base import BaseTestCase
+from .. import jobs
+from ..management.commands.run_jobs import Command
+from ..cache import CacheLock, SingleFlight, TieredCache
+from ..checks import check_report_cache_lock
+from ..datatables import ORDERINGS
+from ..filters import ExpenseFilter
+from ..pagination import ExpenseCursorPagination
 from ..permissions import IsOwnerOrAdmin, IsManagerOrAdmin
 from ..views import ExpenseViewSet, UserViewSet
-from ..serializers import UserSerializer
+from ..serializers import ExpenseRowSerializer, ExpenseSerializer, UserSerializer
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from django.utils.six import StringIO
+from expense_trackapp.models import Expense, Job
 from rest_framework import serializers
-from mock import MagicMock, call
+from rest_framework.renderers import JSONRenderer
+from mock import MagicMock, call, patch
 
 
 class PermissionsTest(BaseTestCase):
@@ -258,3 +283,420 @@ class UserSerializerTest(BaseTestCase):
 
         self.serializer.initial_data['user_type'] = 'is_superuser'
         self.serializer.validate({})
+
+
+class ExpenseRowSerializerTest(BaseTestCase):
+    def test_data(self):
+        """
+        Output is byte-identical to ExpenseSerializer.
+        """
+
+        Expense.objects.create(
+            amount=Decimal('0.5'), user=self.user2, description=None, comment=u'\u20ac')
+        queryset = Expense.objects.order_by('pk')
+        renderer = JSONRenderer()
+
+        expected = renderer.render(ExpenseSerializer(queryset, many=True).data)
+        self.assertEqual(renderer.render(ExpenseRowSerializer(
+            queryset.values_list(*ExpenseRowSerializer.values_fields)).data), expected)
+        self.assertEqual(renderer.render(ExpenseRowSerializer(
+            queryset.values(*ExpenseRowSerializer.values_fields)).data), expected)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Query plans are checked on SQLite.')
+class QueryPlanTest(BaseTestCase):
+    filter_params = {
+        'date': {'date_0': '2017-01-01', 'date_1': '2017-02-01'},
+        'time': {'time_0': '10:00', 'time_1': '12:00'},
+        'amount': {'amount_0': '1.00', 'amount_1': '100.00'},
+    }
+
+    def assertIndexedPlan(self, queryset):
+        """
+        Custom assert that fails on full table scans and temp B-tree sorts.
+        """
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            plan = [row[-1] for row in cursor.fetchall()]
+
+        for detail in plan:
+            self.assertFalse(detail.startswith('SCAN'), '%s\n%s' % (sql, plan))
+            self.assertNotIn('TEMP B-TREE', detail, '%s\n%s' % (sql, plan))
+
+    def test_expense_filter_plans(self):
+        """
+        Every ExpenseFilter combination is served by an index.
+        """
+
+        pagination = ExpenseCursorPagination()
+        position = (self.now.date(), self.expense.amount, self.expense.pk)
+
+        for size in range(len(self.filter_params) + 1):
+            for names in combinations(self.filter_params, size):
+                data = {}
+                for name in names:
+                    data.update(self.filter_params[name])
+                queryset = ExpenseFilter(
+                    data, queryset=Expense.objects.filter(user=self.user)).qs
+
+                # Model ordering and keyset pages in both directions. Without
+                # a date range, SQLite serves amount and time ranges from the
+                # DataTables sort indexes and sorts the matches; that plan is
+                # accepted rather than dropping those sort columns.
+                if 'date' in names or not names:
+                    self.assertIndexedPlan(queryset)
+                self.assertIndexedPlan(pagination.filter_by_position(
+                    queryset.order_by(*pagination.ordering), position, False))
+                self.assertIndexedPlan(pagination.filter_by_position(
+                    queryset.order_by('-date', '-amount', '-pk'), position, True))
+
+        # Keyset pages of superuser listings across every user.
+        self.assertIndexedPlan(pagination.filter_by_position(
+            Expense.objects.order_by(*pagination.ordering), position, False))
+
+    def test_table_plans(self):
+        """
+        Every DataTables sort column is served by an index.
+        """
+
+        queryset = Expense.objects.filter(user=self.user)
+        for ordering in ORDERINGS.values():
+            self.assertIndexedPlan(queryset.order_by(*ordering))
+            self.assertIndexedPlan(
+                queryset.order_by(*['-' + field for field in ordering]))
+
+
+class ImportExpensesTest(BaseTestCase):
+    def setUp(self):
+        super(ImportExpensesTest, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'expenses.csv')
+        with open(self.path, 'w') as csv_file:
+            csv_file.write(
+                'user,date,time,amount,description,comment\n'
+                'foobar,2017-01-01,10:00,10.00,first,\n'
+                'foobar2,2017-01-02,,20.00,,second\n'
+                'foobar,foo,,,,\n'
+                'nobody,2017-01-03,,30.00,,\n'
+                ',2017-01-04,,40.00,,\n'
+            )
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def call_command(self, *args, **kwargs):
+        stdout, stderr = StringIO(), StringIO()
+        call_command(
+            'import_expenses', self.path, *args, stdout=stdout, stderr=stderr, **kwargs)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_import(self):
+        """
+        import_expenses command test.
+        """
+
+        count = Expense.objects.count()
+        stdout, stderr = self.call_command(batch_size=2, default_user='foobar2')
+        self.assertIn('Done: 3 imported, 2 skipped, 5 rows read.', stdout)
+        self.assertIn('Row 4 skipped', stderr)
+        self.assertIn('Row 5 skipped', stderr)
+
+        self.assertEqual(Expense.objects.count(), count + 3)
+        self.assertEqual(
+            list(Expense.objects.filter(date__year=2017).order_by('date').values_list(
+                'user__username', 'amount', 'description', 'comment', 'iso_week')),
+            [
+                ('foobar', Decimal('10.00'), 'first', '', 52),
+                ('foobar2', Decimal('20.00'), '', 'second', 1),
+                ('foobar2', Decimal('40.00'), '', '', 1),
+            ]
+        )
+        with open(self.path + '.checkpoint') as checkpoint:
+            self.assertEqual(checkpoint.read(), '5')
+
+    def test_import_resume(self):
+        """
+        import_expenses resumes after the checkpointed row.
+        """
+
+        with open(self.path + '.checkpoint', 'w') as checkpoint:
+            checkpoint.write('4')
+
+        stdout, stderr = self.call_command(resume=True, default_user='foobar2')
+        self.assertIn('Resuming after row 4.', stdout)
+        self.assertIn('Done: 1 imported, 0 skipped, 5 rows read.', stdout)
+        self.assertTrue(Expense.objects.filter(amount=40, user=self.user2).exists())
+
+
+class SingleFlightTest(SimpleTestCase):
+    def test_do(self):
+        """
+        Concurrent calls with the same key share one computation.
+        """
+        flight = SingleFlight()
+        started, release = threading.Event(), threading.Event()
+        calls, results = [], []
+
+        def compute():
+            calls.append(1)
+            started.set()
+            release.wait()
+            return 'report'
+
+        def request():
+            results.append(flight.do('key', compute))
+
+        threads = [threading.Thread(target=request) for index in range(5)]
+        threads[0].start()
+        started.wait()
+        for thread in threads[1:]:
+            thread.start()
+        while flight.shared < 4:
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['report'] * 5)
+
+        # Finished calls are not shared.
+        self.assertEqual(flight.do('key', lambda: 'again'), 'again')
+
+    def test_do_error(self):
+        """
+        The exception of a failed computation reaches its caller.
+        """
+        flight = SingleFlight()
+
+        def fail():
+            raise ValueError('failed')
+
+        with self.assertRaises(ValueError):
+            flight.do('key', fail)
+        self.assertEqual(flight.do('key', lambda: 'report'), 'report')
+
+
+class TieredCacheTest(TestCase):
+    def setUp(self):
+        self.cache = TieredCache('test', 60)
+
+    def test_delete_while_writing(self):
+        """
+        Values are not kept when their group is deleted before or while
+        they are written.
+        """
+        generation = self.cache.get_generation(1)
+        self.cache.delete_many(1, ['a'])
+        self.cache.set_many(1, {'a': 'stale'}, generation)
+        self.assertEqual(TieredCache('test', 60).get_many(1, ['a']), {})
+
+        generation = self.cache.get_generation(1)
+        backend_set_many = self.cache.backend.set_many
+
+        def set_many_then_delete(values, timeout):
+            backend_set_many(values, timeout)
+            self.cache.delete_many(1, ['b'])
+
+        with patch.object(self.cache.backend, 'set_many', set_many_then_delete):
+            self.cache.set_many(1, {'a': 'stale'}, generation)
+        self.assertEqual(self.cache.get_many(1, ['a']), {})
+        self.assertEqual(TieredCache('test', 60).get_many(1, ['a']), {})
+
+        # Without deletes the values are kept.
+        generation = self.cache.get_generation(1)
+        self.cache.set_many(1, {'a': 'fresh'}, generation)
+        self.assertEqual(TieredCache('test', 60).get_many(1, ['a']), {'a': 'fresh'})
+
+
+class CacheLockTest(TestCase):
+
+    def test_lock(self):
+        """
+        A held lock makes others wait, then lets them run unlocked.
+        """
+        with CacheLock('test-lock') as lock:
+            self.assertTrue(lock.acquired)
+
+            started = time.time()
+            with CacheLock('test-lock', wait=0.1) as other:
+                self.assertFalse(other.acquired)
+            self.assertGreaterEqual(time.time() - started, 0.1)
+
+            # Releasing a lock that is not held leaves it alone.
+            self.assertEqual(caches['shared'].get('test-lock'), lock.token)
+
+        self.assertIsNone(caches['shared'].get('test-lock'))
+        with CacheLock('test-lock', wait=0) as lock:
+            self.assertTrue(lock.acquired)
+
+    def test_lock_other_process(self):
+        """
+        The lock is held in the shared cache, not in the process memory.
+        """
+        with CacheLock('test-lock') as lock:
+            self.assertTrue(lock.acquired)
+            other_process = dict(settings.CACHES, default={
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': 'other-process'})
+            with self.settings(CACHES=other_process):
+                with CacheLock('test-lock', wait=0) as other:
+                    self.assertFalse(other.acquired)
+
+    def test_check(self):
+        """
+        The lock on a per-process cache is warned about.
+        """
+        with self.settings(REPORT_CACHE_LOCK=True):
+            self.assertEqual(check_report_cache_lock(None), [])
+            with self.settings(CACHES=dict(settings.CACHES, shared={
+                    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'})):
+                self.assertEqual(
+                    [warning.id for warning in check_report_cache_lock(None)], ['api.W001'])
+
+
+class JobsTest(BaseTestCase):
+    def setUp(self):
+        super(JobsTest, self).setUp()
+        self.result_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.result_dir)
+        self.job = Job.objects.create(user=self.user, kind=Job.EXPORT, params='{}')
+
+    def test_claim_job(self):
+        """
+        A job is claimed once, oldest first.
+        """
+        later = Job.objects.create(user=self.user, kind=Job.EXPORT, params='{}')
+        self.assertEqual(jobs.claim_job('one'), self.job)
+        self.assertEqual(jobs.claim_job('two'), later)
+        self.assertIsNone(jobs.claim_job('one'))
+        job = Job.objects.get(pk=self.job.pk)
+        self.assertEqual((job.status, job.worker), (Job.RUNNING, 'one'))
+        self.assertIsNotNone(job.heartbeat_at)
+
+    def test_requeue_stale_jobs(self):
+        """
+        Jobs are requeued when their heartbeat stops, however long they run.
+        """
+        jobs.claim_job('one')
+        stale = timezone.now() - timedelta(seconds=settings.JOB_TIMEOUT + 1)
+        Job.objects.update(started_at=stale)
+        self.assertEqual(jobs.requeue_stale_jobs(), 0)
+
+        Job.objects.update(heartbeat_at=stale)
+        self.assertEqual(jobs.send_heartbeat('two'), 0)
+        self.assertEqual(jobs.send_heartbeat('one'), 1)
+        self.assertEqual(jobs.requeue_stale_jobs(), 0)
+
+        Job.objects.update(heartbeat_at=stale)
+        self.assertEqual(jobs.requeue_stale_jobs(), 1)
+        self.assertEqual(jobs.claim_job('two'), self.job)
+
+    def test_requeued_job_result(self):
+        """
+        A worker that lost its job to another one neither records a result
+        nor touches the result of the other one.
+        """
+        Job.objects.update(params='{"format": "csv", "filters": {}}')
+        job = jobs.claim_job('one')
+        Job.objects.update(heartbeat_at=None)
+        jobs.requeue_stale_jobs()
+        other_job = jobs.claim_job('two')
+
+        with self.settings(JOB_RESULT_DIR=self.result_dir), patch('api.jobs.logger') as logger:
+            jobs.run_job(other_job)
+            result_name = Job.objects.get(pk=job.pk).result_name
+            with open(os.path.join(self.result_dir, result_name), 'rb') as result:
+                content = result.read()
+
+            jobs.run_job(job)
+        self.assertTrue(logger.warning.called)
+        job = Job.objects.get(pk=job.pk)
+        self.assertEqual((job.status, job.result_name), (Job.DONE, result_name))
+        self.assertEqual(os.listdir(self.result_dir), [result_name])
+        with open(os.path.join(self.result_dir, result_name), 'rb') as result:
+            self.assertEqual(result.read(), content)
+
+    def test_prune_jobs(self):
+        with self.settings(JOB_RESULT_DIR=self.result_dir):
+            path = os.path.join(self.result_dir, 'job-1.csv')
+            open(path, 'w').close()
+            Job.objects.filter(pk=self.job.pk).update(
+                status=Job.DONE, result_name='job-1.csv',
+                finished_at=timezone.now() - timedelta(seconds=settings.JOB_MAX_AGE + 1))
+            recent = Job.objects.create(
+                user=self.user, kind=Job.EXPORT, status=Job.DONE, finished_at=timezone.now())
+
+            self.assertEqual(jobs.prune_jobs(), 1)
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(list(Job.objects.all()), [recent])
+
+
+class InlineThread(object):
+    """
+    Thread running its target on start(), in the test's transaction; the
+    in-memory test database is not shared with other threads.
+    """
+
+    def __init__(self, target, args=()):
+        self.target = target
+        self.args = args
+
+    def start(self):
+        self.target(*self.args)
+
+    def join(self, timeout=None):
+        pass
+
+    def is_alive(self):
+        return False
+
+
+class RunJobsTest(BaseTestCase):
+    @patch('api.management.commands.run_jobs.connection')
+    @patch('api.management.commands.run_jobs.threading.Thread', InlineThread)
+    def test_run_jobs(self, connection):
+        """
+        The workers run every queued job, then exit with --once.
+        """
+        for export_format in ['csv', 'ndjson', 'csv']:
+            Job.objects.create(
+                user=self.user, kind=Job.EXPORT,
+                params='{"format": "%s", "filters": {}}' % export_format)
+
+        result_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, result_dir)
+        stdout = StringIO()
+        with self.settings(JOB_RESULT_DIR=result_dir):
+            call_command('run_jobs', workers=2, once=True, stdout=stdout)
+
+        self.assertIn('Done: 3 jobs run.', stdout.getvalue())
+        self.assertEqual(
+            list(Job.objects.values_list('status', flat=True).distinct()), [Job.DONE])
+        self.assertEqual(len(os.listdir(result_dir)), 3)
+        self.assertEqual(connection.close.call_count, 2)
+
+    def test_maintain(self):
+        """
+        The heartbeat, requeueing and pruning run periodically.
+        """
+        command = Command()
+        command.stdout = StringIO()
+        command.worker_id = 'one'
+        command.heartbeat_at = command.pruned_at = 0
+
+        with patch.object(jobs, 'send_heartbeat') as send_heartbeat, \
+                patch.object(jobs, 'requeue_stale_jobs', return_value=2) as requeue, \
+                patch.object(jobs, 'prune_jobs') as prune:
+            command.maintain()
+            command.maintain()
+            self.assertEqual(
+                (send_heartbeat.call_count, requeue.call_count, prune.call_count), (1, 1, 1))
+            send_heartbeat.assert_called_with('one')
+            self.assertIn('Requeued 2 stale jobs.', command.stdout.getvalue())
+
+            command.heartbeat_at -= settings.JOB_HEARTBEAT_INTERVAL
+            command.maintain()
+            self.assertEqual(
+                (send_heartbeat.call_count, requeue.call_count, prune.call_count), (2, 2, 1))
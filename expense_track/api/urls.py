@@ -3,6 +3,8 @@ from django.conf.urls import url
 from .views import (
     AccountViewSet,
     ExpenseViewSet,
+    JobViewSet,
+    SignedTokenViewSet,
     UserViewSet,
     not_found_404
 )
@@ -15,13 +17,32 @@ account_register = AccountViewSet.as_view({
     'post': 'create'
 })
 
+account_login_signed = SignedTokenViewSet.as_view({
+    'post': 'create',
+    'delete': 'destroy'
+})
+
 
 """
 Expense views.
 """
 expense_list = ExpenseViewSet.as_view({
     'get': 'list',
-    'post': 'create'
+    'post': 'create',
+    'patch': 'bulk_update',
+    'delete': 'bulk_destroy'
+})
+
+expense_batch = ExpenseViewSet.as_view({
+    'post': 'batch_create'
+})
+
+expense_table = ExpenseViewSet.as_view({
+    'get': 'table'
+})
+
+expense_export = ExpenseViewSet.as_view({
+    'get': 'export'
 })
 
 expense_detail = ExpenseViewSet.as_view({
@@ -38,6 +59,26 @@ report_detail = ExpenseViewSet.as_view({
     'get': 'report'
 })
 
+report_summary = ExpenseViewSet.as_view({
+    'get': 'summary'
+})
+
+
+"""
+Job views.
+"""
+job_list = JobViewSet.as_view({
+    'post': 'create'
+})
+
+job_detail = JobViewSet.as_view({
+    'get': 'retrieve'
+})
+
+job_download = JobViewSet.as_view({
+    'get': 'download'
+})
+
 
 """
 User views.
@@ -57,13 +98,31 @@ user_me = UserViewSet.as_view({
     'get': 'me'
 })
 
+user_report = UserViewSet.as_view({
+    'get': 'report'
+})
+
+user_report_cache = UserViewSet.as_view({
+    'get': 'report_cache_stats'
+})
+
 
 urlpatterns = format_suffix_patterns([
     url(r'^users/$', user_list, name='user_list'),
     url(r'^users/me$', user_me, name='user_me'),
+    url(r'^users/report$', user_report, name='user_report'),
+    url(r'^users/report/cache$', user_report_cache, name='user_report_cache'),
     url(r'^users/(?P<username>[A-Za-z0-9-]+)/$', user_detail, name='user_detail'),
     url(r'^users/(?P<username>[A-Za-z0-9-]+)/expenses/$', expense_list, name='expense_list'),
+    url(r'^users/(?P<username>[A-Za-z0-9-]+)/expenses/batch$', expense_batch, name='expense_batch'),
+    url(r'^users/(?P<username>[A-Za-z0-9-]+)/expenses/table$', expense_table, name='expense_table'),
+    url(r'^users/(?P<username>[A-Za-z0-9-]+)/expenses/export/(?P<export_format>csv|ndjson)$', expense_export, name='expense_export'),
+    url(r'^users/(?P<username>[A-Za-z0-9-]+)/expenses/report/summary$', report_summary, name='report_summary'),
     url(r'^users/(?P<username>[A-Za-z0-9-]+)/expenses/report/(?P<week>\d+)$', report_detail, name='report_detail'),
+    url(r'^users/(?P<username>[A-Za-z0-9-]+)/expenses/report/(?P<year>\d{4})/(?P<week>\d+)$', report_detail, name='report_detail'),
     url(r'^users/(?P<username>[A-Za-z0-9-]+)/expenses/(?P<pk>\d+)$', expense_detail, name='expense_detail'),
+    url(r'^users/(?P<username>[A-Za-z0-9-]+)/jobs/$', job_list, name='job_list'),
+    url(r'^users/(?P<username>[A-Za-z0-9-]+)/jobs/(?P<pk>\d+)$', job_detail, name='job_detail'),
+    url(r'^users/(?P<username>[A-Za-z0-9-]+)/jobs/(?P<pk>\d+)/download$', job_download, name='job_download'),
     url(r'^.*$', not_found_404, name='not_found_404')
 ])
@@ -1,20 +1,108 @@
+import errno
 import json
-from datetime import datetime
+from datetime import timedelta
+from functools import partial
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Avg, Count, Sum
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import six, timezone
+from django.utils.dateparse import parse_date
+from django.utils.decorators import method_decorator
 from rest_framework.authtoken.models import Token
-from django.db.models import Sum, Avg
+from rest_framework.authtoken.serializers import AuthTokenSerializer
 from rest_framework import status, viewsets, permissions
 from rest_framework.decorators import api_view
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.response import Response
-from expense_trackapp.models import Expense
+from expense_trackapp.models import (
+    DeletedExpense,
+    Expense,
+    ExpenseRollup,
+    Job,
+    get_current_date
+)
+from expense_trackapp.pagination import get_count
+from expense_trackapp import reports
+from expense_trackapp.rollups import get_period_range
+from expense_trackapp.utils import chunks
 from .permissions import IsOwnerOrAdmin, IsManagerOrAdmin
+from .authentication import SignedTokenAuthentication
+from . import datatables, jobs, report_cache
+from .conditional import conditional_expenses
+from .export import EXPORT_FORMATS, VALUES_FIELDS
 from .filters import ExpenseFilter
+from .pagination import EstimatedCountPagination, ExpenseCursorPagination
+from .sparse import SparseFieldsViewMixin
+from . import sync
 from .serializers import (
     UserSerializer,
-    ExpenseSerializer
+    ExpenseRowSerializer,
+    ExpenseSerializer,
+    JobSerializer,
+    ReportBucketSerializer,
+    UserReportSerializer
 )
 
 
+def get_date_param(params, name, default):
+    """
+    Return a date parameter, or the default when it is missing.
+    """
+    value = params.get(name)
+    if not value:
+        return default
+    try:
+        day = parse_date(value)
+    except (TypeError, ValueError):
+        day = None
+    if day is None:
+        raise ValidationError({name: ['Enter a valid date.']})
+    return day
+
+
+def get_report_range(params):
+    """
+    Return the period, start and end of a report, the weeks of the last
+    52 weeks by default.
+    """
+    end = get_date_param(params, 'end', get_current_date())
+    start = get_date_param(params, 'start', end - timedelta(weeks=52) + timedelta(days=1))
+    return params.get('period', reports.WEEK), start, end
+
+
+def get_report_week(kwargs):
+    """
+    Return the year and ISO week of a weekly report, the current one by
+    default.
+    """
+    current_year, current_week = get_current_date().isocalendar()[:2]
+    return int(kwargs.get('year') or current_year), int(kwargs.get('week') or current_week)
+
+
+def get_week_etag_key(request, **kwargs):
+    return '%s:%s' % get_report_week(kwargs)
+
+
+def get_report_etag_key(request, **kwargs):
+    """
+    The resolved period, start and end, so reports over a defaulted range
+    are not answered 304 once the current date moves.
+    """
+    return '%s:%s:%s' % get_report_range(request.query_params)
+
+
+def get_user_id(request, username):
+    """
+    Return the id of the user named in the URL, without a query when it
+    is the requesting user, or None when there is no such user.
+    """
+    if username == request.user.username:
+        return request.user.pk
+    return User.objects.filter(username=username).values_list('pk', flat=True).first()
+
+
 @api_view()
 def not_found_404(request):
     """
@@ -28,17 +116,67 @@ class AccountViewSet(viewsets.ModelViewSet):
     permission_classes = (permissions.AllowAny,)
 
 
-class ExpenseViewSet(viewsets.ModelViewSet):
+class SignedTokenViewSet(viewsets.ViewSet):
+    """
+    Issue and revoke stateless signed tokens.
+    """
+    serializer_class = AuthTokenSerializer
+
+    def get_permissions(self):
+        if self.action == 'create':
+            return [permissions.AllowAny()]
+        return [permissions.IsAuthenticated()]
+
+    def create(self, request, **kwargs):
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        token = SignedTokenAuthentication.issue(serializer.validated_data['user'])
+
+        return Response({
+            'token': token,
+            'expires_in': settings.API_SIGNED_TOKEN_MAX_AGE
+        })
+
+    def destroy(self, request, **kwargs):
+        if not isinstance(request.successful_authenticator, SignedTokenAuthentication):
+            return Response(
+                {'detail': 'Only signed tokens can be revoked.'},
+                status=status.HTTP_400_BAD_REQUEST)
+
+        SignedTokenAuthentication.revoke(request.auth)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class ExpenseViewSet(SparseFieldsViewMixin, viewsets.ModelViewSet):
     serializer_class = ExpenseSerializer
     permission_classes = [IsOwnerOrAdmin, ]
-    lookup_fields = ['username', 'pk', 'week']
+    lookup_fields = ['username', 'pk', 'year', 'week']
     filter_class = ExpenseFilter
+    pagination_class = ExpenseCursorPagination
+    page_number_pagination_class = EstimatedCountPagination
+    select_related_fields = ('user', )
+    max_batch_size = 5000
+
+    @property
+    def paginator(self):
+        """
+        Page numbers when a `page` is requested, keyset cursors otherwise.
+        """
+        if not hasattr(self, '_paginator'):
+            if 'page' in self.request.query_params:
+                self._paginator = self.page_number_pagination_class()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
 
     def get_queryset(self):
         if self.request.user.is_superuser:
-            return Expense.objects.all()
+            queryset = Expense.objects.all()
         else:
-            return Expense.objects.filter(user=self.request.user)
+            queryset = Expense.objects.filter(user=self.request.user)
+        # ExpenseSerializer reads user.username.
+        queryset = queryset.select_related(*self.select_related_fields)
+        return self.sparse_queryset(queryset)
 
     def perform_create(self, serializer):
         user = self.request.user
@@ -52,35 +190,349 @@ class ExpenseViewSet(viewsets.ModelViewSet):
 
         serializer.save(user=user)
 
+    @method_decorator(conditional_expenses)
+    def list(self, request, *args, **kwargs):
+        if 'since' in request.query_params:
+            return self.sync(request)
+
+        # Taken before reading, so the first sync repeats rather than
+        # misses rows written while the pages are fetched.
+        cursor = sync.encode_cursor(timezone.now())
+        fields = self.get_requested_fields()
+        # Pagination reads the ordering columns even when they are not shown.
+        values_fields = set(ExpenseRowSerializer.get_values_fields(fields))
+        values_fields.update(self.pagination_class.ordering)
+
+        queryset = self.filter_queryset(self.get_queryset()).order_by(
+            *self.pagination_class.ordering)
+        page = self.paginate_queryset(queryset.values(*values_fields))
+        response = self.get_paginated_response(ExpenseRowSerializer(page, fields).data)
+        response.data['cursor'] = cursor
+        return response
+
+    def sync(self, request):
+        """
+        Return the expenses created, changed or deleted after the `since`
+        cursor, and a cursor for the next sync.
+        """
+        now = timezone.now()
+        since = sync.decode_cursor(request.query_params['since'])
+        if since < now - timedelta(seconds=settings.EXPENSE_TOMBSTONE_MAX_AGE):
+            return Response(
+                {'detail': 'Cursor has expired, fetch the full list.'},
+                status=status.HTTP_410_GONE)
+        since -= sync.SYNC_OVERLAP
+
+        changed = self.filter_queryset(self.get_queryset()).filter(
+            updated_at__gte=since).order_by('date', 'amount', 'pk')
+        changed = ExpenseRowSerializer(
+            changed.values_list(*ExpenseRowSerializer.values_fields)).data
+
+        deleted = DeletedExpense.objects.filter(deleted_at__gte=since)
+        if not request.user.is_superuser:
+            deleted = deleted.filter(user=request.user)
+        # Ids can be reused after a delete, the live row wins.
+        deleted = set(deleted.values_list('expense_id', flat=True))
+        deleted.difference_update(expense['pk'] for expense in changed)
+
+        return Response({
+            'changed': changed,
+            'deleted': sorted(deleted),
+            'cursor': sync.encode_cursor(now)
+        })
+
+    @method_decorator(conditional_expenses)
+    def retrieve(self, request, *args, **kwargs):
+        return super(ExpenseViewSet, self).retrieve(request, *args, **kwargs)
+
+    def table(self, request, **kwargs):
+        """
+        One page of expenses for a DataTables table in server-side mode.
+        """
+        table = datatables.parse_request(request.query_params)
+        queryset = self.get_queryset()
+
+        data = request.query_params.copy()
+        data['search'] = table.search
+        filtered = self.filter_class(data, queryset=queryset, request=request).qs
+        page = filtered.order_by(*table.ordering).values_list(
+            *ExpenseRowSerializer.values_fields)[table.start:table.start + table.length]
+
+        return Response({
+            'draw': table.draw,
+            'recordsTotal': get_count(queryset)[0],
+            'recordsFiltered': get_count(filtered)[0],
+            'data': ExpenseRowSerializer(page).data
+        })
+
+    def batch_create(self, request, **kwargs):
+        """
+        Create a list of expenses with a single bulk insert. Nothing is
+        saved unless every item is valid.
+        """
+        if not isinstance(request.data, list):
+            return Response(
+                {'detail': 'Expected a list of expenses.'},
+                status=status.HTTP_400_BAD_REQUEST)
+        if len(request.data) > self.max_batch_size:
+            return Response(
+                {'detail': 'Batch size is limited to %s expenses.' % self.max_batch_size},
+                status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid()
+        errors = serializer.errors or [{} for item in request.data]
+
+        # Same user rules as perform_create, resolved with a single query.
+        users = [request.user] * len(request.data)
+        if request.user.is_superuser:
+            usernames = [
+                item.get('user') if isinstance(item, dict) else None
+                for item in request.data
+            ]
+            found = {
+                user.username: user
+                for user in User.objects.filter(username__in=filter(None, usernames))
+            }
+            for index, username in enumerate(usernames):
+                if not username:
+                    continue
+                if username in found:
+                    users[index] = found[username]
+                else:
+                    errors[index].setdefault('user', []).append('User does not exist.')
+        elif request.user.is_staff:
+            return Response({'count': 0}, status=status.HTTP_201_CREATED)
+
+        if any(errors):
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+        expenses = Expense.objects.bulk_create([
+            Expense(user=user, **data)
+            for user, data in zip(users, serializer.validated_data)
+        ])
+
+        return Response({'count': len(expenses)}, status=status.HTTP_201_CREATED)
+
+    def get_bulk_queryset(self, request):
+        """
+        Return the expenses selected by an `ids` list (body or comma
+        separated query parameter) or by ExpenseFilter query parameters.
+        """
+        ids = request.query_params.get('ids')
+        if ids is None and isinstance(request.data, dict):
+            ids = request.data.get('ids')
+        if isinstance(ids, six.string_types):
+            ids = ids.split(',')
+
+        queryset = self.filter_queryset(self.get_queryset())
+        if ids is not None:
+            try:
+                ids = [int(pk) for pk in ids]
+            except (TypeError, ValueError):
+                raise ValidationError({'ids': ['A list of integers is required.']})
+            return queryset.filter(pk__in=ids)
+
+        if not any(
+                request.query_params.get(name + suffix)
+                for name in ExpenseFilter.Meta.fields for suffix in ('_0', '_1')):
+            raise ValidationError({'detail': 'Select expenses by ids or filter parameters.'})
+        return queryset
+
+    def bulk_update(self, request, **kwargs):
+        """
+        Apply the same change to every selected expense, one UPDATE per chunk.
+        """
+        if not isinstance(request.data, dict):
+            raise ValidationError({'detail': 'Expected an object of fields to update.'})
+        queryset = self.get_bulk_queryset(request)
+        data = {key: value for key, value in request.data.items() if key != 'ids'}
+        serializer = self.get_serializer(data=data, partial=True)
+        serializer.is_valid(raise_exception=True)
+        if not serializer.validated_data:
+            raise ValidationError({'detail': 'No fields to update.'})
+
+        count = 0
+        with transaction.atomic():
+            for pks in chunks(list(queryset.values_list('pk', flat=True))):
+                count += Expense.objects.filter(pk__in=pks).update(
+                    **serializer.validated_data)
+
+        return Response({'count': count})
+
+    def bulk_destroy(self, request, **kwargs):
+        """
+        Delete every selected expense, one DELETE per chunk.
+        """
+        queryset = self.get_bulk_queryset(request)
+
+        count = 0
+        with transaction.atomic():
+            for pks in chunks(list(queryset.values_list('pk', flat=True))):
+                count += Expense.objects.filter(pk__in=pks).delete()[0]
+
+        return Response({'count': count})
+
+    def export(self, request, export_format, **kwargs):
+        """
+        Stream the filtered expenses as CSV or newline delimited JSON,
+        reading rows straight from the database cursor.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = queryset.order_by('date', 'amount', 'pk').values_list(*VALUES_FIELDS)
+        lines, content_type = EXPORT_FORMATS[export_format]
+
+        response = StreamingHttpResponse(lines(rows.iterator()), content_type=content_type)
+        response['Content-Disposition'] = 'attachment; filename="expenses.%s"' % export_format
+        return response
+
+    @method_decorator(partial(conditional_expenses, etag_key=get_week_etag_key))
     def report(self, request, **kwargs):
+        username = kwargs.get('username')
+        year, week = get_report_week(kwargs)
+
+        def compute():
+            try:
+                user = User.objects.get(username=username)
+            except User.DoesNotExist as error:
+                return str(error)
+
+            rollup = ExpenseRollup.objects.filter(
+                user=user, period=ExpenseRollup.WEEK, year=year, number=week).first()
+
+            total = rollup.total if rollup else None
+            average = rollup.average if rollup else None
+            return 'Weekly report:\n \tTotal: %s\n\tAverage: %s\n' % (total, average)
+
+        # Dashboards refreshing at once ask for the same week together.
+        return Response(report_cache.report_flight.do(('week', username, year, week), compute))
+
+    @method_decorator(partial(conditional_expenses, etag_key=get_report_etag_key))
+    def summary(self, request, **kwargs):
+        """
+        Count, total, average, minimum and maximum per day, week, month,
+        quarter or year between two dates, the last 52 weeks by default.
+        """
+        period, start, end = get_report_range(request.query_params)
+
+        user_id = get_user_id(request, kwargs.get('username'))
+        if user_id is None:
+            raise NotFound('User does not exist.')
         try:
-            user = User.objects.get(username=kwargs.get('username'))
-        except User.DoesNotExist as error:
-            return Response(str(error))
+            buckets = report_cache.get_report(user_id, period, start, end)
+        except ValueError as error:
+            raise ValidationError({'detail': str(error)})
 
-        week = kwargs.get('week', datetime.now().isocalendar()[1])
-        weekly_expenses = Expense.objects.filter(user=user, date__week=week)
+        return Response({
+            'period': period,
+            'start': start,
+            'end': end,
+            'buckets': ReportBucketSerializer(buckets, many=True).data
+        })
 
-        total = weekly_expenses.aggregate(Sum('amount'))['amount__sum']
-        average = weekly_expenses.aggregate(Avg('amount'))['amount__avg']
-        report = 'Weekly report:\n \tTotal: %s\n\tAverage: %s\n' % (total, average)
 
-        return Response(report)
+class JobViewSet(viewsets.GenericViewSet):
+    """
+    Submit reports and exports to the run_jobs worker, poll them and
+    download their results.
+    """
+    serializer_class = JobSerializer
+    permission_classes = [IsOwnerOrAdmin, ]
+    filter_params = [
+        name + suffix for name in ExpenseFilter.Meta.fields for suffix in ('_0', '_1')
+    ] + ['search']
+
+    def get_queryset(self):
+        if self.request.user.is_superuser:
+            return Job.objects.select_related('user')
+        return Job.objects.select_related('user').filter(user=self.request.user)
+
+    def create(self, request, **kwargs):
+        kind = request.data.get('kind')
+        if kind == Job.REPORT:
+            params = self.get_report_params(request, kwargs.get('username'))
+        elif kind == Job.EXPORT:
+            params = self.get_export_params(request)
+        else:
+            raise ValidationError({'kind': ['Kind must be one of: %s.' % ', '.join(
+                sorted(dict(Job.KIND_CHOICES)))]})
+
+        job = Job.objects.create(user=request.user, kind=kind, params=json.dumps(params))
+        return Response(self.get_serializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+    def get_report_params(self, request, username):
+        period, start, end = get_report_range(request.data)
+        try:
+            reports.get_buckets(period, start, end)
+        except ValueError as error:
+            raise ValidationError({'detail': str(error)})
+
+        user_id = get_user_id(request, username)
+        if user_id is None:
+            raise ValidationError({'detail': 'User does not exist.'})
+        return {
+            'user_id': user_id,
+            'period': period,
+            'start': start.isoformat(),
+            'end': end.isoformat()
+        }
+
+    def get_export_params(self, request):
+        export_format = request.data.get('format')
+        if export_format not in EXPORT_FORMATS:
+            raise ValidationError({'format': ['Format must be one of: %s.' % ', '.join(
+                sorted(EXPORT_FORMATS))]})
+
+        filters = {
+            name: request.data[name] for name in self.filter_params if name in request.data
+        }
+        form = ExpenseFilter(filters, queryset=Expense.objects.none()).form
+        if not form.is_valid():
+            raise ValidationError(form.errors)
+        return {'format': export_format, 'filters': filters}
 
+    def retrieve(self, request, **kwargs):
+        return Response(self.get_serializer(self.get_object()).data)
 
-class UserViewSet(viewsets.ModelViewSet):
+    def download(self, request, **kwargs):
+        job = self.get_object()
+        if job.status != Job.DONE:
+            return Response(
+                {'detail': 'Job is %s.' % job.status}, status=status.HTTP_409_CONFLICT)
+
+        try:
+            result = open(jobs.get_result_path(job), 'rb')
+        except IOError as error:
+            if error.errno != errno.ENOENT:
+                raise
+            return Response(
+                {'detail': 'Job result is no longer available.'}, status=status.HTTP_410_GONE)
+
+        response = FileResponse(result, content_type=job.content_type)
+        response['Content-Disposition'] = 'attachment; filename="%s"' % job.result_name
+        return response
+
+
+class UserViewSet(SparseFieldsViewMixin, viewsets.ModelViewSet):
     serializer_class = UserSerializer
     permission_classes = [IsManagerOrAdmin, ]
     lookup_field = 'username'
+    report_pagination_class = EstimatedCountPagination
+    report_orderings = {
+        'username': ('user__username', ),
+        '-username': ('-user__username', ),
+        'total': ('total', 'user__username'),
+        '-total': ('-total', 'user__username'),
+    }
 
     def get_queryset(self):
         if self.request.user.is_superuser or self.request.user.is_staff:
-            return User.objects.all()
+            return self.sparse_queryset(User.objects.all())
 
     def get_object(self):
         username = self.kwargs.get('username')
         if username:
-            return User.objects.get(username=username)
+            return self.sparse_queryset(User.objects.all()).get(username=username)
 
     def me(self, request, **kwargs):
         try:
@@ -90,3 +542,40 @@ class UserViewSet(viewsets.ModelViewSet):
 
         return Response(
             json.dumps({'token': token.key, 'user': token.user.username}))
+
+    def report(self, request, **kwargs):
+        """
+        Expense count, total and average of every user with expenses
+        between two dates, the current ISO week by default. One grouped
+        query per page, ordered by username or by total.
+        """
+        current_year, current_week = get_current_date().isocalendar()[:2]
+        week_start, week_end = get_period_range(ExpenseRollup.WEEK, current_year, current_week)
+        start = get_date_param(request.query_params, 'start', week_start)
+        end = get_date_param(request.query_params, 'end', week_end)
+        if start > end:
+            raise ValidationError({'detail': 'Start must not be after end.'})
+
+        ordering = request.query_params.get('ordering', 'username')
+        if ordering not in self.report_orderings:
+            raise ValidationError({'ordering': [
+                'Ordering must be one of: %s.' % ', '.join(sorted(self.report_orderings))]})
+
+        queryset = Expense.objects.filter(date__range=(start, end)).values(
+            'user__username').annotate(
+            count=Count('pk'), total=Sum('amount'), average=Avg('amount')).order_by(
+            *self.report_orderings[ordering])
+
+        paginator = self.report_pagination_class()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        response = paginator.get_paginated_response(UserReportSerializer(page, many=True).data)
+        response.data['start'] = start
+        response.data['end'] = end
+        return response
+
+    def report_cache_stats(self, request, **kwargs):
+        """
+        Hit and miss counts of the report cache in this process.
+        """
+        return Response(dict(
+            report_cache.report_cache.get_stats(), enabled=settings.REPORT_CACHE))
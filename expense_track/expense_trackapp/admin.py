@@ -1,9 +1,49 @@
 from django.contrib import admin
+from django.core.exceptions import PermissionDenied
 from .models import Expense
+from .pagination import EstimatedCountPaginator
 
 
 class ExpenseAdmin(admin.ModelAdmin):
+    """
+    Admin for a large expense table: unfiltered pages are counted from the
+    table estimate, rows are listed with their user in one query and bulk
+    actions run as single queryset statements.
+    """
     model = Expense
-    list_display = ('date', 'amount')
+    list_display = ('date', 'time', 'amount', 'user', 'description')
+    list_select_related = ('user', )
+    list_per_page = 50
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    date_hierarchy = 'date'
+    raw_id_fields = ('user', )
+    actions = ['clear_comments', 'clear_descriptions', 'delete_expenses']
+
+    def get_actions(self, request):
+        # The stock delete action loads every selected expense to list
+        # them for confirmation.
+        actions = super(ExpenseAdmin, self).get_actions(request)
+        actions.pop('delete_selected', None)
+        if not self.has_delete_permission(request):
+            actions.pop('delete_expenses', None)
+        return actions
+
+    def clear_comments(self, request, queryset):
+        count = queryset.update(comment='')
+        self.message_user(request, 'Cleared comments of %s expenses.' % count)
+    clear_comments.short_description = 'Clear comments of selected expenses'
+
+    def clear_descriptions(self, request, queryset):
+        count = queryset.update(description='')
+        self.message_user(request, 'Cleared descriptions of %s expenses.' % count)
+    clear_descriptions.short_description = 'Clear descriptions of selected expenses'
+
+    def delete_expenses(self, request, queryset):
+        if not self.has_delete_permission(request):
+            raise PermissionDenied
+        count, deleted = queryset.delete()
+        self.message_user(request, 'Deleted %s expenses.' % count)
+    delete_expenses.short_description = 'Delete selected expenses'
 
 admin.site.register(Expense, ExpenseAdmin)
@@ -6,3 +6,6 @@ from django.apps import AppConfig
 
 class ExpenseTrackappConfig(AppConfig):
     name = 'expense_trackapp'
+
+    def ready(self):
+        from . import checks, signals  # noqa
@@ -0,0 +1,28 @@
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Warning, register
+
+
+def is_per_process(alias):
+    return isinstance(caches[alias], (LocMemCache, DummyCache))
+
+
+@register()
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Expense versions, and what else must agree between processes, are kept
+    in the `shared` cache. A per-process backend is only right for a
+    single process.
+    """
+    if is_per_process('shared'):
+        return [Warning(
+            'The shared cache uses a per-process backend.',
+            hint=(
+                'With several processes, writes in one are not seen by the '
+                'others. Use the database cache or memcached for '
+                'CACHES["shared"].'
+            ),
+            id='expense_trackapp.W001',
+        )]
+    return []
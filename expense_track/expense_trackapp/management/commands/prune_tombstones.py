@@ -0,0 +1,14 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from expense_trackapp.models import DeletedExpense
+
+
+class Command(BaseCommand):
+    help = 'Delete tombstones of deleted expenses older than EXPENSE_TOMBSTONE_MAX_AGE.'
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(seconds=settings.EXPENSE_TOMBSTONE_MAX_AGE)
+        count, deleted = DeletedExpense.objects.filter(deleted_at__lt=cutoff).delete()
+        self.stdout.write('Pruned %s tombstones.' % count)
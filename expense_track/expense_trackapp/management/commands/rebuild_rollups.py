@@ -0,0 +1,21 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from expense_trackapp.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild weekly and monthly expense rollups from scratch.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', action='append', dest='usernames', default=[],
+            help='Only rebuild rollups of this user (can be repeated).'
+        )
+
+    def handle(self, *args, **options):
+        users = None
+        if options['usernames']:
+            users = User.objects.filter(username__in=options['usernames'])
+
+        count = rebuild_rollups(users)
+        self.stdout.write('Rebuilt %s rollups.' % count)
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def backfill_iso_week(apps, schema_editor):
+    Expense = apps.get_model('expense_trackapp', 'Expense')
+    dates = Expense.objects.order_by().values_list('date', flat=True).distinct()
+    for date in dates.iterator():
+        iso_year, iso_week = date.isocalendar()[:2]
+        Expense.objects.filter(date=date).update(iso_year=iso_year, iso_week=iso_week)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expense_trackapp', '0003_expenserollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='expense',
+            name='iso_week',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='expense',
+            name='iso_year',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_iso_week, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['user', 'iso_year', 'iso_week'], name='expense_tra_user_id_dfd251_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+from django.db.models import Count, Max, Min, Sum
+
+
+def fill_rollups(apps, schema_editor):
+    """
+    Rollups are only maintained for expenses written after 0003, build
+    them for the existing ones.
+    """
+    from expense_trackapp.rollups import fold_buckets
+
+    Expense = apps.get_model('expense_trackapp', 'Expense')
+    ExpenseRollup = apps.get_model('expense_trackapp', 'ExpenseRollup')
+
+    days = Expense.objects.order_by().values_list('user_id', 'date').annotate(
+        Count('pk'), Sum('amount'), Min('amount'), Max('amount'))
+    buckets = fold_buckets(days.iterator())
+
+    ExpenseRollup.objects.all().delete()
+    ExpenseRollup.objects.bulk_create([
+        ExpenseRollup(
+            user_id=user_id, period=period, year=year, number=number,
+            count=count, total=total, minimum=minimum, maximum=maximum
+        )
+        for (user_id, period, year, number), (count, total, minimum, maximum)
+        in buckets.items()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expense_trackapp', '0008_job'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_rollups, migrations.RunPython.noop),
+    ]
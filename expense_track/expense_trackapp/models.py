@@ -1,6 +1,21 @@
-from django.db import models
+from decimal import Decimal
+from django.db import models, transaction
+from django.dispatch import Signal
 from django.utils import timezone
 from django.conf import settings
+from .utils import chunks
+
+
+# Bulk queryset operations bypass post_save and post_delete, so they send
+# these instead. `previous` is a list of (pk, user_id, date, amount) rows
+# as they were before the operation.
+bulk_created = Signal(providing_args=['instances'])
+bulk_updated = Signal(providing_args=['previous', 'changes'])
+bulk_deleted = Signal(providing_args=['previous'])
+
+# Sent after any of the above with the (user_id, date) pairs whose
+# expenses changed, before and after the change.
+expenses_changed = Signal(providing_args=['days'])
 
 
 def get_current_time():
@@ -11,16 +26,213 @@ def get_current_date():
     return timezone.localtime(timezone.now()).date()
 
 
+class ExpenseQuerySet(models.QuerySet):
+    def bulk_create(self, objs, batch_size=None):
+        objs = list(objs)
+        for obj in objs:
+            obj.set_iso_week()
+
+        with transaction.atomic(using=self.db):
+            objs = super(ExpenseQuerySet, self).bulk_create(objs, batch_size)
+            bulk_created.send(sender=self.model, instances=objs)
+        return objs
+
+    def update(self, **kwargs):
+        # auto_now is only applied by save(), so bulk updates set it here.
+        kwargs.setdefault('updated_at', timezone.now())
+        if 'date' in kwargs:
+            date = self.model._meta.get_field('date').to_python(kwargs['date'])
+            kwargs['iso_year'], kwargs['iso_week'] = date.isocalendar()[:2]
+
+        with transaction.atomic(using=self.db):
+            previous = list(self.order_by().values_list('pk', 'user_id', 'date', 'amount'))
+            count = super(ExpenseQuerySet, self).update(**kwargs)
+            bulk_updated.send(sender=self.model, previous=previous, changes=kwargs)
+        return count
+    update.alters_data = True
+
+    def delete(self):
+        """
+        Delete with a single statement instead of loading every instance
+        for post_delete. Nothing references expenses, so there is nothing
+        to cascade.
+        """
+        assert self.query.can_filter(), \
+            "Cannot use 'limit' or 'offset' with delete."
+
+        with transaction.atomic(using=self.db):
+            previous = list(self.order_by().values_list('pk', 'user_id', 'date', 'amount'))
+            count = 0
+            for pks in chunks([row[0] for row in previous]):
+                count += self.model._base_manager.using(self.db).filter(
+                    pk__in=pks)._raw_delete(self.db)
+            bulk_deleted.send(sender=self.model, previous=previous)
+        return count, {self.model._meta.label: count}
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
 class Expense(models.Model):
     class Meta:
         ordering = ['date', 'amount']
+        indexes = [
+            models.Index(fields=['user', 'date', 'amount']),
+            models.Index(fields=['user', 'date', 'time']),
+            models.Index(fields=['user', 'iso_year', 'iso_week']),
+            models.Index(fields=['user', 'updated_at']),
+            # DataTables sorting by amount and by time.
+            models.Index(fields=['user', 'amount', 'id']),
+            models.Index(fields=['user', 'time', 'id']),
+            # Listings across all users, e.g. for superusers and the admin.
+            models.Index(fields=['date', 'amount']),
+        ]
 
     def __unicode__(self):
         return ' '.join([str(self.date), str(self.amount)])
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(Expense, cls).from_db(db, field_names, values)
+        # Remember what the rollups have counted, so an update can be
+        # subtracted from the buckets the expense was previously in.
+        if not instance.get_deferred_fields().intersection(('user_id', 'date', 'amount')):
+            instance._loaded_values = (instance.user_id, instance.date, instance.amount)
+        return instance
+
+    def set_iso_week(self):
+        """
+        Store the ISO year and week of the expense date, so weekly lookups
+        are plain indexed comparisons instead of per-row date functions.
+        """
+        self.date = self._meta.get_field('date').to_python(self.date)
+        self.iso_year, self.iso_week = self.date.isocalendar()[:2]
+
+    def save(self, *args, **kwargs):
+        self.set_iso_week()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'date' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'iso_year', 'iso_week'}
+
+        # Rollups are maintained by signals, keep them in the same transaction.
+        with transaction.atomic():
+            super(Expense, self).save(*args, **kwargs)
+
     user = models.ForeignKey(settings.AUTH_USER_MODEL)
     date = models.DateField(default=get_current_date)
     time = models.TimeField(default=get_current_time)
     description = models.CharField(max_length=1024, null=True, blank=True, default='')
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     comment = models.CharField(max_length=1024, null=True, blank=True, default='')
+    iso_year = models.PositiveSmallIntegerField(editable=False)
+    iso_week = models.PositiveSmallIntegerField(editable=False)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = ExpenseQuerySet.as_manager()
+
+
+class DeletedExpense(models.Model):
+    """
+    Tombstone of a deleted expense, so sync clients can drop it too.
+    """
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'deleted_at']),
+        ]
+
+    def __unicode__(self):
+        return ' '.join([str(self.expense_id), str(self.deleted_at)])
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL)
+    expense_id = models.PositiveIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+
+class ExpenseRollup(models.Model):
+    """
+    Pre-aggregated expenses of one user for one ISO week or calendar month.
+    """
+    WEEK = 'week'
+    MONTH = 'month'
+    PERIOD_CHOICES = (
+        (WEEK, 'Week'),
+        (MONTH, 'Month'),
+    )
+
+    class Meta:
+        unique_together = ('user', 'period', 'year', 'number')
+
+    def __unicode__(self):
+        return ' '.join([self.period, str(self.year), str(self.number)])
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL)
+    period = models.CharField(max_length=5, choices=PERIOD_CHOICES)
+    year = models.PositiveSmallIntegerField()
+    number = models.PositiveSmallIntegerField()
+    count = models.PositiveIntegerField(default=0)
+    total = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    minimum = models.DecimalField(max_digits=10, decimal_places=2)
+    maximum = models.DecimalField(max_digits=10, decimal_places=2)
+
+    @property
+    def average(self):
+        return (self.total / self.count).quantize(Decimal('0.01'))
+
+
+class Job(models.Model):
+    """
+    Report or export computed by the run_jobs worker outside the request
+    cycle. `params` is JSON, the result is a file in JOB_RESULT_DIR.
+
+    A running job belongs to `worker`, which renews `heartbeat_at` while it
+    is alive.
+    """
+    REPORT = 'report'
+    EXPORT = 'export'
+    KIND_CHOICES = (
+        (REPORT, 'Report'),
+        (EXPORT, 'Export'),
+    )
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __unicode__(self):
+        return ' '.join([self.kind, str(self.pk), self.status])
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL)
+    kind = models.CharField(max_length=6, choices=KIND_CHOICES)
+    params = models.TextField(default='{}')
+    status = models.CharField(max_length=7, choices=STATUS_CHOICES, default=QUEUED)
+    result_name = models.CharField(max_length=255, blank=True, default='')
+    content_type = models.CharField(max_length=64, blank=True, default='')
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    worker = models.CharField(max_length=128, blank=True, default='')
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+
+
+class TokenCutoff(models.Model):
+    """
+    Signed API tokens of a user issued before `not_before` (a UNIX time)
+    are rejected. Keyed by the bare user id, so it outlives the user.
+    """
+    def __unicode__(self):
+        return ' '.join([str(self.user_id), str(self.not_before)])
+
+    user_id = models.PositiveIntegerField(unique=True)
+    not_before = models.FloatField()
@@ -0,0 +1,102 @@
+from django.core.cache import caches
+from django.core.paginator import Paginator
+from django.db import connections, transaction
+from django.utils.functional import cached_property
+
+
+# Cached row counts are replaced by a fresh estimate this often, so drift
+# from missed adjustments does not last.
+ROW_COUNT_TIMEOUT = 60 * 60
+
+
+def estimate_count(model, using='default'):
+    """
+    Return a cheap estimate of the number of rows of a model's table,
+    or None when the database offers none. Tables never analyzed by
+    PostgreSQL estimate zero rows, which is treated as no estimate.
+    """
+    connection = connections[using]
+    table = connection.ops.quote_name(model._meta.db_table)
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE oid = %s::regclass', [table])
+        elif connection.vendor == 'mysql':
+            cursor.execute(
+                'SELECT table_rows FROM information_schema.tables '
+                'WHERE table_schema = DATABASE() AND table_name = %s',
+                [model._meta.db_table])
+        elif connection.vendor == 'sqlite':
+            # Read from the end of the rowid B-tree; rows deleted below
+            # the highest id make this an overestimate.
+            cursor.execute('SELECT MAX(_rowid_) FROM %s' % table)
+        else:
+            return None
+        row = cursor.fetchone()
+
+    if row is None or row[0] is None or row[0] < 1:
+        return None
+    return int(row[0])
+
+
+def get_row_count_key(model):
+    return 'row-count:%s' % model._meta.label_lower
+
+
+def get_row_count(model, using='default'):
+    """
+    Return the row count of a model's table cached in the shared cache,
+    seeded from the table estimate, or from COUNT(*) where there is none.
+    """
+    key = get_row_count_key(model)
+    count = caches['shared'].get(key)
+    if count is None:
+        count = estimate_count(model, using)
+        if count is None:
+            count = model._default_manager.using(using).count()
+        caches['shared'].add(key, count, ROW_COUNT_TIMEOUT)
+    return count
+
+
+def adjust_row_count(model, delta):
+    """
+    Add delta to the cached row count once the transaction commits.
+    A count that is not cached is seeded on its next read instead.
+    """
+    key = get_row_count_key(model)
+
+    def adjust():
+        try:
+            if delta > 0:
+                caches['shared'].incr(key, delta)
+            elif delta < 0:
+                caches['shared'].decr(key, -delta)
+        except ValueError:
+            pass
+
+    transaction.on_commit(adjust)
+
+
+def get_count(queryset):
+    """
+    Return (count, approximate). Unfiltered querysets are counted from the
+    cached row count, filtered ones exactly.
+    """
+    if queryset.query.where:
+        return queryset.count(), False
+    return get_row_count(queryset.model, queryset.db), True
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator counting unfiltered querysets from the cached row count
+    instead of a COUNT(*) over every row. `approximate` tells whether the
+    count is one.
+    """
+    approximate = False
+
+    @cached_property
+    def count(self):
+        count, self.approximate = get_count(self.object_list)
+        return count
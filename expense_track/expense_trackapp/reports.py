@@ -0,0 +1,150 @@
+from datetime import date, timedelta
+from django.db.models import Count, Sum, Min, Max
+from django.db.models.functions import TruncMonth, TruncYear
+from .models import ExpenseRollup
+from .rollups import get_period_range
+
+
+DAY = 'day'
+WEEK = ExpenseRollup.WEEK
+MONTH = ExpenseRollup.MONTH
+QUARTER = 'quarter'
+YEAR = 'year'
+PERIODS = (DAY, WEEK, MONTH, QUARTER, YEAR)
+
+# Keeps a report of daily buckets over a few years in one response.
+MAX_BUCKETS = 1000
+
+
+def get_bucket(period, day):
+    """
+    Return the key of the bucket a date falls into.
+    """
+    if period == DAY:
+        return day.year, day.month, day.day
+    if period == WEEK:
+        return day.isocalendar()[:2]
+    if period == MONTH:
+        return day.year, day.month
+    if period == QUARTER:
+        return day.year, (day.month - 1) // 3 + 1
+    return day.year,
+
+
+def get_bucket_range(period, bucket):
+    """
+    Return the first and the last date of a bucket.
+    """
+    if period == DAY:
+        day = date(*bucket)
+        return day, day
+    if period in (WEEK, MONTH):
+        return get_period_range(period, *bucket)
+    if period == QUARTER:
+        year, quarter = bucket
+        return (
+            get_period_range(MONTH, year, quarter * 3 - 2)[0],
+            get_period_range(MONTH, year, quarter * 3)[1],
+        )
+    return date(bucket[0], 1, 1), date(bucket[0], 12, 31)
+
+
+def get_buckets(period, start, end):
+    """
+    Return the keys of every bucket between two dates, in order. Raises
+    ValueError for an unknown period, or a range that is reversed or has
+    too many buckets.
+    """
+    if period not in PERIODS:
+        raise ValueError('Period must be one of: %s.' % ', '.join(PERIODS))
+    if start > end:
+        raise ValueError('Start must not be after end.')
+
+    buckets = []
+    day = start
+    while day <= end:
+        bucket = get_bucket(period, day)
+        buckets.append(bucket)
+        if len(buckets) > MAX_BUCKETS:
+            raise ValueError('Reports are limited to %s buckets.' % MAX_BUCKETS)
+        day = get_bucket_range(period, bucket)[1] + timedelta(days=1)
+    return buckets
+
+
+def get_grouped_rows(expenses, period):
+    """
+    Aggregate expenses per bucket with a single GROUP BY query. Returns
+    (bucket, count, total, minimum, maximum) rows; quarters are grouped
+    by month in SQL and folded here.
+    """
+    if period == DAY:
+        group = ('date', )
+    elif period == WEEK:
+        group = ('iso_year', 'iso_week')
+    else:
+        trunc = TruncYear if period == YEAR else TruncMonth
+        expenses = expenses.annotate(truncated=trunc('date'))
+        group = ('truncated', )
+
+    rows = expenses.order_by().values_list(*group).annotate(
+        Count('pk'), Sum('amount'), Min('amount'), Max('amount'))
+
+    for row in rows:
+        if period == WEEK:
+            bucket = row[:2]
+        else:
+            bucket = get_bucket(period, row[0])
+        yield (bucket, ) + tuple(row[len(group):])
+
+
+def get_report(expenses, period, start, end, cache=None):
+    """
+    Return count, total, average, minimum and maximum of the expenses for
+    every bucket of a period between two dates, empty buckets included.
+
+    With a cache, (count, total, minimum, maximum) of buckets lying wholly
+    between the dates are read from and written to it, keyed by bucket,
+    and only the range of the missing buckets is queried.
+    """
+    buckets = get_buckets(period, start, end)
+    cacheable = [
+        bucket for bucket in buckets
+        if start <= get_bucket_range(period, bucket)[0] and
+        get_bucket_range(period, bucket)[1] <= end
+    ]
+    totals = cache.get_many(cacheable) if cache is not None else {}
+    missing = [bucket for bucket in buckets if bucket not in totals]
+
+    if missing:
+        computed = dict((bucket, [0, 0, None, None]) for bucket in missing)
+        query_start = max(start, get_bucket_range(period, missing[0])[0])
+        query_end = min(end, get_bucket_range(period, missing[-1])[1])
+        rows = get_grouped_rows(
+            expenses.filter(date__range=(query_start, query_end)), period)
+        for bucket, count, total, minimum, maximum in rows:
+            values = computed.get(bucket)
+            if values is None:
+                continue
+            values[0] += count
+            values[1] += total
+            values[2] = minimum if values[2] is None else min(values[2], minimum)
+            values[3] = maximum if values[3] is None else max(values[3], maximum)
+        totals.update(computed)
+        if cache is not None:
+            cache.set_many(dict(
+                (bucket, computed[bucket]) for bucket in cacheable if bucket in computed))
+
+    report = []
+    for bucket in buckets:
+        count, total, minimum, maximum = totals[bucket]
+        bucket_start, bucket_end = get_bucket_range(period, bucket)
+        report.append({
+            'start': bucket_start,
+            'end': bucket_end,
+            'count': count,
+            'total': total,
+            'average': total / count if count else None,
+            'minimum': minimum,
+            'maximum': maximum,
+        })
+    return report
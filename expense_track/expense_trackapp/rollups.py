@@ -0,0 +1,154 @@
+from collections import defaultdict
+from datetime import date, timedelta
+from django.db import transaction
+from django.db.models import Count, Sum, Min, Max
+from .models import Expense, ExpenseRollup
+
+
+def get_periods(day):
+    """
+    Return (period, year, number) of every rollup bucket a date falls into.
+    """
+    iso_year, iso_week = day.isocalendar()[:2]
+    return [
+        (ExpenseRollup.WEEK, iso_year, iso_week),
+        (ExpenseRollup.MONTH, day.year, day.month),
+    ]
+
+
+def get_period_range(period, year, number):
+    """
+    Return the first and the last date of a rollup bucket.
+    """
+    if period == ExpenseRollup.WEEK:
+        # ISO week 1 is the week containing January 4th.
+        jan4 = date(year, 1, 4)
+        start = jan4 - timedelta(days=jan4.isoweekday() - 1) + timedelta(weeks=number - 1)
+        return start, start + timedelta(days=6)
+
+    start = date(year, number, 1)
+    if number == 12:
+        return start, date(year, 12, 31)
+    return start, date(year, number + 1, 1) - timedelta(days=1)
+
+
+def get_period_expenses(user_id, period, year, number):
+    """
+    Return the expenses of a user that fall into a rollup bucket.
+    """
+    if period == ExpenseRollup.WEEK:
+        return Expense.objects.filter(user_id=user_id, iso_year=year, iso_week=number)
+
+    start, end = get_period_range(period, year, number)
+    return Expense.objects.filter(user_id=user_id, date__range=(start, end))
+
+
+def fold_buckets(days):
+    """
+    Fold per-day (user_id, date, count, total, minimum, maximum) rows into
+    {(user_id, period, year, number): [count, total, minimum, maximum]}.
+    """
+    buckets = defaultdict(lambda: [0, 0, None, None])
+    for user_id, day, count, total, minimum, maximum in days:
+        for key in get_periods(day):
+            bucket = buckets[(user_id, ) + key]
+            bucket[0] += count
+            bucket[1] += total
+            bucket[2] = minimum if bucket[2] is None else min(bucket[2], minimum)
+            bucket[3] = maximum if bucket[3] is None else max(bucket[3], maximum)
+    return buckets
+
+
+def add_expenses(values):
+    """
+    Count (user_id, date, amount) expenses into their rollup buckets,
+    touching every affected bucket once.
+    """
+    buckets = fold_buckets(
+        (user_id, day, 1, amount, amount, amount) for user_id, day, amount in values)
+
+    with transaction.atomic():
+        for (user_id, period, year, number), (count, total, minimum, maximum) in buckets.items():
+            rollup, created = ExpenseRollup.objects.select_for_update().get_or_create(
+                user_id=user_id, period=period, year=year, number=number,
+                defaults={'minimum': minimum, 'maximum': maximum}
+            )
+            rollup.count += count
+            rollup.total += total
+            rollup.minimum = min(rollup.minimum, minimum)
+            rollup.maximum = max(rollup.maximum, maximum)
+            rollup.save()
+
+
+def add_expense(user_id, day, amount):
+    """
+    Count an expense into its rollup buckets.
+    """
+    add_expenses([(user_id, day, amount)])
+
+
+def remove_expenses(values):
+    """
+    Subtract (user_id, date, amount) expenses from their rollup buckets.
+    Buckets that lose their minimum or maximum are rescanned.
+    """
+    buckets = fold_buckets(
+        (user_id, day, 1, amount, amount, amount) for user_id, day, amount in values)
+
+    with transaction.atomic():
+        for (user_id, period, year, number), (count, total, minimum, maximum) in buckets.items():
+            try:
+                rollup = ExpenseRollup.objects.select_for_update().get(
+                    user_id=user_id, period=period, year=year, number=number)
+            except ExpenseRollup.DoesNotExist:
+                continue
+
+            rollup.count -= count
+            if rollup.count <= 0:
+                rollup.delete()
+                continue
+
+            rollup.total -= total
+            if minimum <= rollup.minimum or maximum >= rollup.maximum:
+                extremes = get_period_expenses(user_id, period, year, number).aggregate(
+                    Min('amount'), Max('amount'))
+                rollup.minimum = extremes['amount__min']
+                rollup.maximum = extremes['amount__max']
+            rollup.save()
+
+
+def remove_expense(user_id, day, amount):
+    """
+    Subtract an expense from its rollup buckets.
+    """
+    remove_expenses([(user_id, day, amount)])
+
+
+def rebuild_rollups(users=None):
+    """
+    Recompute rollups from scratch, for all users or only the given ones.
+    Expenses are aggregated per day in SQL and folded into buckets here.
+    """
+    expenses = Expense.objects.order_by()
+    rollups = ExpenseRollup.objects.all()
+    if users is not None:
+        expenses = expenses.filter(user__in=users)
+        rollups = rollups.filter(user__in=users)
+
+    days = expenses.values_list('user_id', 'date').annotate(
+        Count('pk'), Sum('amount'), Min('amount'), Max('amount'))
+
+    buckets = fold_buckets(days.iterator())
+
+    with transaction.atomic():
+        rollups.delete()
+        ExpenseRollup.objects.bulk_create([
+            ExpenseRollup(
+                user_id=user_id, period=period, year=year, number=number,
+                count=count, total=total, minimum=minimum, maximum=maximum
+            )
+            for (user_id, period, year, number), (count, total, minimum, maximum)
+            in buckets.items()
+        ], batch_size=500)
+
+    return len(buckets)
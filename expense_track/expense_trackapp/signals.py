@@ -0,0 +1,126 @@
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from .models import (
+    Expense,
+    DeletedExpense,
+    bulk_created,
+    bulk_updated,
+    bulk_deleted,
+    expenses_changed
+)
+from .utils import chunks
+from .pagination import adjust_row_count
+from . import rollups, versions
+
+
+def get_rollup_values(instance):
+    """
+    Return (user_id, date, amount) of an expense, as stored in the database.
+    """
+    date = Expense._meta.get_field('date').to_python(instance.date)
+    amount = Expense._meta.get_field('amount').to_python(instance.amount)
+    return instance.user_id, date, amount.quantize(Decimal('0.01'))
+
+
+@receiver(pre_save, sender=Expense)
+def load_previous_values(sender, instance, raw, **kwargs):
+    """
+    Expenses saved without being loaded first still need their old values.
+    """
+    if raw or not instance.pk or hasattr(instance, '_loaded_values'):
+        return
+
+    instance._loaded_values = sender.objects.filter(pk=instance.pk).values_list(
+        'user_id', 'date', 'amount').first()
+
+
+@receiver(post_save, sender=Expense)
+def expense_saved(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+
+    values = get_rollup_values(instance)
+    previous = getattr(instance, '_loaded_values', None)
+
+    if created:
+        adjust_row_count(sender, 1)
+
+    if previous != values:
+        if previous is not None and not created:
+            rollups.remove_expense(*previous)
+            # Moved to another user, so it is gone for the previous one.
+            if previous[0] != values[0]:
+                DeletedExpense.objects.create(user_id=previous[0], expense_id=instance.pk)
+        rollups.add_expense(*values)
+        expenses_changed.send(
+            sender=sender, days=[values[:2]] + ([previous[:2]] if previous else []))
+    versions.bump_versions([values[0]] + ([previous[0]] if previous else []))
+    instance._loaded_values = values
+
+
+@receiver(post_delete, sender=Expense)
+def expense_deleted(sender, instance, **kwargs):
+    values = getattr(instance, '_loaded_values', None) or get_rollup_values(instance)
+    rollups.remove_expense(*values)
+    adjust_row_count(sender, -1)
+    DeletedExpense.objects.create(user_id=values[0], expense_id=instance.pk)
+    expenses_changed.send(sender=sender, days=[values[:2]])
+    versions.bump_versions([values[0]])
+
+
+@receiver(bulk_created, sender=Expense)
+def expenses_bulk_created(sender, instances, **kwargs):
+    values = [get_rollup_values(instance) for instance in instances]
+    rollups.add_expenses(values)
+    adjust_row_count(sender, len(values))
+    expenses_changed.send(sender=sender, days=[row[:2] for row in values])
+    versions.bump_versions([row[0] for row in values])
+    for instance, instance_values in zip(instances, values):
+        instance._loaded_values = instance_values
+
+
+@receiver(bulk_updated, sender=Expense)
+def expenses_bulk_updated(sender, previous, changes, **kwargs):
+    user_ids = [row[1] for row in previous]
+    if set(changes).intersection(('user', 'user_id', 'date', 'amount')):
+        current = []
+        for pks in chunks([row[0] for row in previous]):
+            current.extend(sender.objects.filter(pk__in=pks).values_list(
+                'pk', 'user_id', 'date', 'amount'))
+
+        rollups.remove_expenses([row[1:] for row in previous])
+        rollups.add_expenses([row[1:] for row in current])
+        user_ids.extend(row[1] for row in current)
+
+        previous_users = {row[0]: row[1] for row in previous}
+        DeletedExpense.objects.bulk_create([
+            DeletedExpense(user_id=previous_users[pk], expense_id=pk)
+            for pk, user_id, date, amount in current
+            if previous_users[pk] != user_id
+        ])
+        expenses_changed.send(
+            sender=sender, days=[row[1:3] for row in previous] + [row[1:3] for row in current])
+    versions.bump_versions(user_ids)
+
+
+@receiver(bulk_deleted, sender=Expense)
+def expenses_bulk_deleted(sender, previous, **kwargs):
+    rollups.remove_expenses([row[1:] for row in previous])
+    adjust_row_count(sender, -len(previous))
+    DeletedExpense.objects.bulk_create([
+        DeletedExpense(user_id=user_id, expense_id=pk)
+        for pk, user_id, date, amount in previous
+    ])
+    expenses_changed.send(sender=sender, days=[row[1:3] for row in previous])
+    versions.bump_versions([row[1] for row in previous])
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    """
+    Deleting a user deletes their expenses, which leaves tombstones nobody
+    will sync.
+    """
+    DeletedExpense.objects.filter(user_id=instance.pk).delete()
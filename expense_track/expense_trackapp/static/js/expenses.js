@@ -3,68 +3,83 @@ $(document).ready(function() {
 });
 
 function getTable() {
-	if (window.dt) {
-		window.dt.destroy();
-		$('#expenses-table tbody').html('');
-	}
-	var token = 'Token ' + window.token;
-	var username = window.user;
-	var url = '/api/users/' + username + '/expenses/';
-	$.ajax({
-        url: url,
-        beforeSend: function(xhr) {
-            xhr.setRequestHeader('Authorization', token);
+	window.data = {};
+	var token = window.tokenKeyword + ' ' + window.token;
+	var buttons = function(cls, action, label) {
+		return function(pk) {
+			return '<button class="btn ' + cls + '" data-action="' + action +
+				'" data-pk="' + pk + '">' + label + '</button>';
+		};
+	};
+    var dtConf = {
+        serverSide: true,
+        processing: true,
+        ajax: {
+            url: '/api/users/' + window.user + '/expenses/table',
+            beforeSend: function(xhr) {
+                xhr.setRequestHeader('Authorization', token);
+            },
+            dataSrc: function(json) {
+            	// Expenses of the current page by pk.
+                window.data = {};
+                $.each(json.data, function(i, val) {
+                	window.data[val.pk] = val;
+                });
+                return json.data;
+            }
         },
-        success: function(data) {
-        	window.data = data;
-        	$.each(data, function(i, val) {
-        		var row = '<tr><td>';
-        		row += val.date + '</td><td>' + val.time + '</td><td>';
-        		row += val.amount + '</td><td>' + val.comment + '</td><td>';
-        		row += val.description + '</td><td>';
-        		row += '<button class="btn btn-success edit" id="' + val.pk + '">Edit</button></td><td>'
-        		row += '<button class="btn btn-danger delete" id="' + val.pk + '">Delete</button></td>'
-        		row += '</tr>';
-        		$('#expenses-table tbody').append(row);
-        	});
-            var dtConf = {
-                destroy: true,
-                order: [[0, 'asc'], [1, 'asc']],
-                responsive: true,
-		        select: {
-		            style:    'os',
-		            selector: 'td:first-child'
-		        }
-           	};
-           	window.dt = $('#expenses-table').DataTable(dtConf);
-           	$('.delete').on('click', function() {
-				var id = $(this).attr('id');
-				deleteExpense(id);
-		   	});
-		   	$('.edit').on('click', function() {
-				var id = $(this).attr('id');
-				editExpense(id);
-		   	});
+        rowId: function(val) {
+        	return 'expense-' + val.pk;
         },
-        error: function(jqXHR) {
-        	console.log(jqXHR);
+        columns: [
+            { data: 'date' },
+            { data: 'time' },
+            { data: 'amount' },
+            { data: 'comment', orderable: false },
+            { data: 'description', orderable: false },
+            { data: 'pk', orderable: false, render: buttons('btn-success', 'edit', 'Edit') },
+            { data: 'pk', orderable: false, render: buttons('btn-danger', 'delete', 'Delete') }
+        ],
+        order: [[0, 'asc']],
+        responsive: true,
+        select: {
+            style:    'os',
+            selector: 'td:first-child'
         }
-    });
+   	};
+   	window.dt = $('#expenses-table').DataTable(dtConf);
+}
+
+// Redraw the current page only. In server-side mode this fetches just
+// that page, which is needed whenever rows enter or leave it.
+function redrawPage() {
+	window.dt.draw(false);
+}
+
+function updateRow(expense) {
+	window.data[expense.pk] = expense;
+	// Any edited column may move the row within the sort order, or out of
+	// the search, so the page is fetched again.
+	redrawPage();
 }
 
+$('#expenses-table').on('click', 'button[data-action]', function() {
+	var button = $(this);
+	var pk = button.data('pk');
+	if (button.data('action') === 'edit') {
+		editExpense(pk);
+	} else {
+		deleteExpense(pk);
+	}
+});
+
 function deleteExpense(id) {
-	var user, i, ok;
-	ok = confirm('Are you sure you want to delete this expense?');
+	var expense = window.data[id];
+	if (!expense) return;
+	var ok = confirm('Are you sure you want to delete this expense?');
 	if (!ok) return;
-	for (i = 0; i < window.data.length; i += 1) {
-		if (window.data[i].pk === parseInt(id)) {
-			user = window.data[i].user;
-			break;
-		}
-	}
-	if (!user) return;
-	var url = '/api/users/' + user + '/expenses/' + id;
-	var token = 'Token ' + window.token;
+	var url = '/api/users/' + expense.user + '/expenses/' + id;
+	var token = window.tokenKeyword + ' ' + window.token;
 	$.ajax({
 		url: url,
 		type: 'DELETE',
@@ -72,7 +87,10 @@ function deleteExpense(id) {
             xhr.setRequestHeader('Authorization', token);
         },
         data: { csrftoken: Cookies.get('csrftoken') },
-        success: getTable,
+        success: function() {
+        	delete window.data[id];
+        	redrawPage();
+        },
         error: function(jqXHR) {
         	console.log(jqXHR);
         }
@@ -80,13 +98,7 @@ function deleteExpense(id) {
 }
 
 function editExpense(id) {
-	var expense, i;
-	for (i = 0; i < window.data.length; i += 1) {
-		if (window.data[i].pk === parseInt(id)) {
-			expense = window.data[i];
-			break;
-		}
-	}
+	var expense = window.data[id];
 	if (!expense) return;
 
 	$('#mform-user').val(expense.user);
@@ -113,7 +125,7 @@ $('#msave').click(function() {
 	var id = $('#mform-id').val();
 
 	var url = '/api/users/' + user + '/expenses/' + id;
-	var token = 'Token ' + window.token;
+	var token = window.tokenKeyword + ' ' + window.token;
 	$.ajax({
 		url: url,
 		type: 'PUT',
@@ -130,7 +142,7 @@ $('#msave').click(function() {
         	comment: comment
         },
         success: function(data) {
-        	getTable()
+        	updateRow(data);
         	$('#edit-modal').modal('toggle');
         },
         error: function(jqXHR) {
@@ -162,7 +174,7 @@ $('#new-expense').submit(function(e) {
 	var comment = $('#form-comment').val();
 
 	var url = '/api/users/' + window.user + '/expenses/';
-	var token = 'Token ' + window.token;
+	var token = window.tokenKeyword + ' ' + window.token;
 	$.ajax({
 		url: url,
 		type: 'POST',
@@ -178,7 +190,7 @@ $('#new-expense').submit(function(e) {
         	comment: comment
         },
         success: function(data) {
-        	getTable();
+        	redrawPage();
         	$('#new-expense').hide();
 			$('#add-expense').show();
 			$('#new-expense').find(
@@ -1,6 +1,20 @@
+from datetime import date
+from decimal import Decimal
+from importlib import import_module
 from django import forms
-from django.test import TestCase, Client
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches
+from django.test import TestCase, TransactionTestCase, Client
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils.six import StringIO
+from .checks import check_shared_cache
 from .forms import RegisterForm
+from .models import Expense, ExpenseRollup
+from .pagination import get_count, get_row_count
+from api.authentication import SignedTokenAuthentication
 from django.core.urlresolvers import reverse
 from django.contrib.auth.models import User
 
@@ -96,6 +110,25 @@ class ViewsTest(TestCase):
         self.assertTemplateUsed(response, 'index.html')
         self.assertTrue(self.client.login(**login_data))
 
+    def test_index_token(self):
+        """
+        Dashboard API token test.
+        """
+
+        self.client.login(username='foobar', password='mypassword')
+        response = self.client.get(reverse('index'))
+        self.assertEqual(response.context['token_keyword'], 'Token')
+        self.assertEqual(len(response.context['token']), 40)
+
+        with self.settings(API_SIGNED_TOKENS=True):
+            response = self.client.get(reverse('index'))
+        self.assertEqual(response.context['token_keyword'], 'Bearer')
+        self.assertEqual(
+            SignedTokenAuthentication().authenticate_credentials(
+                response.context['token'])[0].pk,
+            self.user.pk
+        )
+
     def test_logout(self):
         """
         Logout test.
@@ -172,3 +205,265 @@ class ViewsTest(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, 'registration/register.html')
         self.assertEqual(response.content.count('This field is required.'), 4)
+
+
+class ExpenseModelTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='foobar',
+            email='foo@bar.com',
+            password='mypassword'
+        )
+
+    def test_iso_week(self):
+        """
+        ISO year and week are stored on save.
+        """
+
+        expense = Expense.objects.create(user=self.user, amount=1, date='2017-01-01')
+        self.assertEqual((expense.iso_year, expense.iso_week), (2016, 52))
+
+        expense.date = date(2017, 1, 2)
+        expense.save(update_fields=['date'])
+        expense = Expense.objects.get(pk=expense.pk)
+        self.assertEqual((expense.iso_year, expense.iso_week), (2017, 1))
+
+
+class RollupsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='foobar',
+            email='foo@bar.com',
+            password='mypassword'
+        )
+
+    def assertRollup(self, period, year, number, count, total, minimum, maximum):
+        """
+        Custom assert for checking a single rollup bucket.
+        """
+        rollup = ExpenseRollup.objects.get(
+            user=self.user, period=period, year=year, number=number)
+        self.assertEqual(
+            (rollup.count, rollup.total, rollup.minimum, rollup.maximum),
+            (count, Decimal(total), Decimal(minimum), Decimal(maximum))
+        )
+
+    def test_rollups_maintained(self):
+        """
+        Rollups follow expense create, update and delete.
+        """
+
+        # 2017-01-01 is in ISO week 52 of 2016, 2017-01-02 starts week 1.
+        expense = Expense.objects.create(
+            user=self.user, amount=float(10), date=date(2017, 1, 1))
+        expense2 = Expense.objects.create(
+            user=self.user, amount='20.50', date='2017-01-02')
+        self.assertRollup(ExpenseRollup.WEEK, 2016, 52, 1, '10', '10', '10')
+        self.assertRollup(ExpenseRollup.WEEK, 2017, 1, 1, '20.50', '20.50', '20.50')
+        self.assertRollup(ExpenseRollup.MONTH, 2017, 1, 2, '30.50', '10', '20.50')
+
+        # Moving an expense moves it between buckets.
+        expense.date = date(2017, 1, 3)
+        expense.save()
+        self.assertFalse(ExpenseRollup.objects.filter(
+            period=ExpenseRollup.WEEK, year=2016, number=52).exists())
+        self.assertRollup(ExpenseRollup.WEEK, 2017, 1, 2, '30.50', '10', '20.50')
+
+        # Saving an unloaded instance still subtracts the old amount.
+        Expense(pk=expense2.pk, user=self.user, amount=5, date=date(2017, 1, 2)).save()
+        self.assertRollup(ExpenseRollup.MONTH, 2017, 1, 2, '15', '5', '10')
+
+        # Deleting the maximum rescans the bucket.
+        Expense.objects.filter(pk=expense.pk).delete()
+        self.assertRollup(ExpenseRollup.WEEK, 2017, 1, 1, '5', '5', '5')
+
+        expense2.delete()
+        self.assertFalse(ExpenseRollup.objects.exists())
+
+    def test_rollups_bulk_create(self):
+        """
+        Rollups follow bulk created expenses.
+        """
+
+        Expense.objects.create(user=self.user, amount=15, date=date(2017, 1, 2))
+        Expense.objects.bulk_create([
+            Expense(user=self.user, amount=10, date=date(2017, 1, 1)),
+            Expense(user=self.user, amount=20, date='2017-01-03'),
+        ])
+        self.assertRollup(ExpenseRollup.WEEK, 2016, 52, 1, '10', '10', '10')
+        self.assertRollup(ExpenseRollup.WEEK, 2017, 1, 2, '35', '15', '20')
+        self.assertRollup(ExpenseRollup.MONTH, 2017, 1, 3, '45', '10', '20')
+
+    def test_rollups_bulk_update_delete(self):
+        """
+        Rollups follow queryset updates and deletes.
+        """
+
+        Expense.objects.create(user=self.user, amount=10, date=date(2017, 1, 2))
+        Expense.objects.create(user=self.user, amount=20, date=date(2017, 1, 3))
+        Expense.objects.create(user=self.user, amount=30, date=date(2017, 1, 4))
+
+        Expense.objects.filter(amount__gte=20).update(date=date(2017, 1, 1))
+        self.assertRollup(ExpenseRollup.WEEK, 2016, 52, 2, '50', '20', '30')
+        self.assertRollup(ExpenseRollup.WEEK, 2017, 1, 1, '10', '10', '10')
+
+        Expense.objects.filter(amount=30).update(amount=5)
+        self.assertRollup(ExpenseRollup.WEEK, 2016, 52, 2, '25', '5', '20')
+        self.assertRollup(ExpenseRollup.MONTH, 2017, 1, 3, '35', '5', '20')
+
+        self.assertEqual(Expense.objects.filter(amount__lte=10).delete()[0], 2)
+        self.assertRollup(ExpenseRollup.MONTH, 2017, 1, 1, '20', '20', '20')
+        self.assertFalse(ExpenseRollup.objects.filter(
+            period=ExpenseRollup.WEEK, year=2017, number=1).exists())
+
+    def test_rebuild_rollups(self):
+        """
+        rebuild_rollups command test.
+        """
+
+        Expense.objects.create(user=self.user, amount=10, date=date(2017, 1, 1))
+        Expense.objects.create(user=self.user, amount=20, date=date(2017, 1, 1))
+        Expense.objects.create(user=self.user, amount=30, date=date(2017, 2, 1))
+        expected = list(ExpenseRollup.objects.order_by(
+            'period', 'year', 'number').values_list(
+                'period', 'year', 'number', 'count', 'total', 'minimum', 'maximum'))
+
+        ExpenseRollup.objects.all().delete()
+        ExpenseRollup.objects.create(
+            user=self.user, period=ExpenseRollup.WEEK, year=2000, number=1,
+            minimum=1, maximum=1)
+        call_command('rebuild_rollups', stdout=StringIO())
+
+        self.assertEqual(expected, list(ExpenseRollup.objects.order_by(
+            'period', 'year', 'number').values_list(
+                'period', 'year', 'number', 'count', 'total', 'minimum', 'maximum')))
+        self.assertEqual(len(expected), 4)
+
+    def test_average(self):
+        """
+        Averages are rounded to cents.
+        """
+
+        for amount in (10, 5, 5):
+            Expense.objects.create(user=self.user, amount=amount, date=date(2017, 1, 2))
+        rollup = ExpenseRollup.objects.get(period=ExpenseRollup.WEEK, year=2017, number=1)
+        self.assertEqual(str(rollup.average), '6.67')
+
+    def test_fill_rollups_migration(self):
+        """
+        The data migration builds rollups of existing expenses.
+        """
+
+        Expense.objects.create(user=self.user, amount=10, date=date(2017, 1, 1))
+        Expense.objects.create(user=self.user, amount=30, date=date(2017, 2, 1))
+        expected = list(ExpenseRollup.objects.order_by(
+            'period', 'year', 'number').values_list(
+                'period', 'year', 'number', 'count', 'total', 'minimum', 'maximum'))
+
+        ExpenseRollup.objects.all().delete()
+        fill_rollups = import_module(
+            'expense_trackapp.migrations.0009_fill_expense_rollups').fill_rollups
+        fill_rollups(apps, None)
+
+        self.assertEqual(expected, list(ExpenseRollup.objects.order_by(
+            'period', 'year', 'number').values_list(
+                'period', 'year', 'number', 'count', 'total', 'minimum', 'maximum')))
+
+
+class ExpenseAdminTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser(
+            username='foobar', email='foo@bar.com', password='mypassword')
+        self.client.login(username='foobar', password='mypassword')
+        caches['shared'].clear()
+        Expense.objects.bulk_create([
+            Expense(user=self.user, date=date(2017, 1, day), amount=day, comment='foo')
+            for day in range(1, 11)
+        ])
+        self.url = reverse('admin:expense_trackapp_expense_changelist')
+
+    def test_changelist(self):
+        """
+        Unfiltered pages are not counted with COUNT(*).
+        """
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['cl'].result_count, 10)
+        self.assertFalse(any(
+            'COUNT(' in query['sql'] and 'expense_trackapp_expense' in query['sql']
+            for query in context.captured_queries))
+
+        # Filtered pages are counted exactly.
+        Expense.objects.filter(amount=10).delete()
+        response = self.client.get(self.url, {'date__year': 2017})
+        self.assertEqual(response.context['cl'].result_count, 9)
+
+    def test_actions(self):
+        """
+        Bulk actions test.
+        """
+
+        pks = list(Expense.objects.filter(amount__lte=3).values_list('pk', flat=True))
+        self.client.post(self.url, {'action': 'clear_comments', '_selected_action': pks})
+        self.assertEqual(Expense.objects.filter(comment='').count(), 3)
+
+        self.client.post(self.url, {'action': 'delete_expenses', '_selected_action': pks})
+        self.assertEqual(Expense.objects.count(), 7)
+        self.assertEqual(
+            ExpenseRollup.objects.get(period=ExpenseRollup.MONTH, year=2017, number=1).count, 7)
+
+
+class RowCountTest(TransactionTestCase):
+    def setUp(self):
+        caches['shared'].clear()
+        self.user = User.objects.create_user(username='foobar', password='mypassword')
+
+    def test_row_count(self):
+        """
+        Cached row counts follow committed writes.
+        """
+
+        self.assertEqual(get_row_count(Expense), 0)
+        expense = Expense.objects.create(user=self.user, amount=1)
+        Expense.objects.bulk_create([Expense(user=self.user, amount=2) for i in range(3)])
+        self.assertEqual(get_row_count(Expense), 4)
+
+        expense.delete()
+        Expense.objects.filter(pk__in=list(
+            Expense.objects.values_list('pk', flat=True)[:2])).delete()
+        self.assertEqual(get_row_count(Expense), 1)
+
+        # Filtered querysets are counted exactly.
+        self.assertEqual(get_count(Expense.objects.all()), (1, True))
+        self.assertEqual(get_count(Expense.objects.filter(amount=1)), (0, False))
+
+    def test_row_count_across_processes(self):
+        """
+        Writes made by another process, with its own per-process cache,
+        adjust the row count.
+        """
+
+        self.assertEqual(get_row_count(Expense), 0)
+        other_process = dict(settings.CACHES, default={
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'other-process',
+        })
+        with self.settings(CACHES=other_process):
+            Expense.objects.bulk_create([Expense(user=self.user, amount=2) for i in range(3)])
+        self.assertEqual(get_row_count(Expense), 3)
+
+
+class ChecksTest(TestCase):
+    def test_shared_cache(self):
+        """
+        A per-process shared cache is warned about.
+        """
+
+        self.assertEqual(check_shared_cache(None), [])
+        with self.settings(CACHES=dict(settings.CACHES, shared={
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'})):
+            self.assertEqual(
+                [warning.id for warning in check_shared_cache(None)],
+                ['expense_trackapp.W001'])
@@ -0,0 +1,10 @@
+# Keeps `pk IN (...)` lists under SQLite's limit of 999 query parameters.
+CHUNK_SIZE = 500
+
+
+def chunks(items, size=CHUNK_SIZE):
+    """
+    Split a list into consecutive lists of at most `size` items.
+    """
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
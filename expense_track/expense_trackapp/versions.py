@@ -0,0 +1,47 @@
+import uuid
+from django.core.cache import caches
+from django.db import transaction
+
+
+# Version of the whole expense table, used for superuser listings.
+ALL_USERS = 'all'
+
+
+def get_cache_key(user_id):
+    return 'expense-version:%s' % user_id
+
+
+def new_version():
+    return uuid.uuid4().hex
+
+
+def get_version(user_id=ALL_USERS):
+    """
+    Return the version of a user's expenses. Versions live in the
+    shared cache, so a write in one process changes them for all. A version
+    lost from the cache is replaced by a fresh one, which only costs
+    clients a single full response.
+    """
+    cache = caches['shared']
+    key = get_cache_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, new_version(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_versions(user_ids):
+    """
+    Give the users, and the whole table, new versions. They are bumped
+    again on commit, so a response built from data read before the commit
+    cannot keep the new version.
+    """
+    keys = [get_cache_key(user_id) for user_id in set(user_ids)]
+    keys.append(get_cache_key(ALL_USERS))
+
+    def bump():
+        caches['shared'].set_many({key: new_version() for key in keys}, None)
+
+    bump()
+    transaction.on_commit(bump)
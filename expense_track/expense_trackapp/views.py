@@ -1,14 +1,23 @@
+from django.conf import settings
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from .forms import RegisterForm
 from django.contrib.auth.models import User
 from rest_framework.authtoken.models import Token
+from api.authentication import SignedTokenAuthentication
 
 
 @login_required
 def index(request):
-    token = Token.objects.get_or_create(user=request.user)[0]
-    context = {'user': token.user, 'token': token.key}
+    if settings.API_SIGNED_TOKENS:
+        context = {
+            'user': request.user,
+            'token': SignedTokenAuthentication.issue(request.user),
+            'token_keyword': SignedTokenAuthentication.keyword
+        }
+    else:
+        token = Token.objects.get_or_create(user=request.user)[0]
+        context = {'user': token.user, 'token': token.key, 'token_keyword': 'Token'}
     return render(request, 'index.html', context)
 
 
@@ -44,6 +44,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.SQLInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -141,9 +142,102 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ),
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
+        'api.authentication.SignedTokenAuthentication',
     ),
     'DEFAULT_FILTER_BACKENDS': (
         'django_filters.rest_framework.DjangoFilterBackend',
     )
 }
+
+# Caches
+
+# `default` is per process. `shared` holds what every process must agree on,
+# like expense versions for conditional GETs, so it must be a backend shared
+# between processes: the database cache (run `manage.py createcachetable`)
+# or memcached.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'expense_track_cache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
+    },
+}
+
+# Signed API tokens
+
+# Hand the dashboard a signed token instead of a database token.
+API_SIGNED_TOKENS = False
+
+API_SIGNED_TOKEN_MAX_AGE = 60 * 60 * 24
+
+# Expense sync
+
+# Seconds tombstones of deleted expenses are kept. Sync cursors older than
+# this are refused, and clients fetch the full list again.
+EXPENSE_TOMBSTONE_MAX_AGE = 60 * 60 * 24 * 30
+
+# Report cache
+
+# Keep report buckets in the shared cache, behind a small per-process LRU,
+# see api.report_cache. Needs CACHES['shared'] to reach every process.
+REPORT_CACHE = True
+
+# Seconds a report bucket is kept in the shared cache.
+REPORT_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Let one process at a time compute missing report buckets, while the
+# others wait for them, see api.report_cache.UserReportCache. The lock is
+# held in CACHES['shared'].
+REPORT_CACHE_LOCK = False
+
+# Background jobs
+
+# Directory the run_jobs worker writes report and export results to.
+JOB_RESULT_DIR = os.path.join(BASE_DIR, 'jobs')
+
+# Seconds between heartbeats of the jobs a run_jobs worker is running.
+JOB_HEARTBEAT_INTERVAL = 30
+
+# Seconds without a heartbeat after which a running job is taken to belong
+# to a dead worker and is queued again.
+JOB_TIMEOUT = 60 * 5
+
+# Seconds a finished job and its result are kept.
+JOB_MAX_AGE = 60 * 60 * 24 * 7
+
+# SQL instrumentation
+
+# Add Server-Timing headers and log the queries and timings of each request,
+# see api.middleware.SQLInstrumentationMiddleware.
+SQL_INSTRUMENTATION = False
+
+# Requests between logged per URL name summaries.
+SQL_INSTRUMENTATION_SUMMARY_INTERVAL = 100
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'api.instrumentation': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'api.jobs': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
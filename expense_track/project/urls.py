@@ -2,7 +2,7 @@ from django.conf.urls import url, include
 from django.contrib import admin
 from django.contrib.auth.views import login, logout
 from rest_framework.authtoken.views import obtain_auth_token
-from api.urls import account_register
+from api.urls import account_register, account_login_signed
 from expense_trackapp.views import register
 
 
@@ -14,5 +14,6 @@ urlpatterns = [
     url(r'', include('expense_trackapp.urls')),
     url(r'^api/', include('api.urls')),
     url(r'^api-auth$', obtain_auth_token, name='account_login'),
+    url(r'^api-auth/signed$', account_login_signed, name='account_login_signed'),
     url(r'^api-register$', account_register, name='account_register'),
 ]